@@ -3,13 +3,22 @@ Multi-Agent Data Analysis System
 Powered by OpenAI Agents SDK
 """
 import os
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
-from agents import Agent, Runner, function_tool
+from agents import Agent, Runner, RunContextWrapper, function_tool
+from openai.types.responses import ResponseTextDeltaEvent
 from dotenv import load_dotenv
 import ssl
-from typing import Optional, Dict, List, Union
+from typing import Optional, Dict, Iterator, List, Union
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 # Import our tools
 from tools import data_tools, statistical_tools, visualization_tools, formatting_tools
@@ -22,24 +31,256 @@ ssl._create_default_https_context = ssl._create_unverified_context
 # Load environment variables
 load_dotenv()
 
+# Keep text columns Arrow-backed (the default from pandas 3 on) so they hand off to
+# st.dataframe without conversion; numeric columns stay NumPy-backed because pandas'
+# Arrow numeric dtypes lack reductions the statistical tools use (e.g. kurtosis)
+pd.set_option('future.infer_string', True)
+
 # Initialize session state
 if 'dataframe' not in st.session_state:
     st.session_state.dataframe = None
-if 'agents' not in st.session_state:
-    st.session_state.agents = {}
+
+# Patterns used to recover tables from agent output, compiled once per process
+_CORR_RE = re.compile(r'(\w+)\s+and\s+(\w+)[:\s]+([-]?\d+\.?\d*)', re.IGNORECASE)
+_QUERY_RESULTS_RE = re.compile(r'query results.*?rows?\)?[:\s]*', re.IGNORECASE)
+_ORDER_BY_RE = re.compile(r'(?:order by|sort by)\s+(\w+)')
+_LIMIT_RE = re.compile(r'limit\s+(\d+)')
+_FOOTER_RE = re.compile(r'\n\(showing first \d+ of \d+ rows\)\s*$')
+# multi_filter conditions such as 'age>=30,city==Paris'
+_COND_RE = re.compile(r'(\w+)\s*(>=|<=|==|!=|>|<)\s*([^,]+)')
+
+# Keyword buckets for route_query, as word stems: the query is tokenised once and a
+# token belongs to a bucket when it starts with one of its stems (one str.startswith
+# call per token), so 'plotting', 'filters' and 'correlated' count like their stem.
+# Multi-word phrases are matched with a substring scan
+_WORD_RE = re.compile(r'\w+')
+_ANALYSIS_PHRASES = ('order by', 'sort by', 'group by')
+_ANALYSIS_STEMS = ('where', 'limit', 'select', 'filter', 'sort', 'top', 'first')
+_VISUALIZATION_STEMS = ('plot', 'chart', 'graph', 'visuali', 'histogram', 'scatter', 'bar', 'heatmap',
+                        'boxplot', 'lineplot')
+_STATISTICAL_STEMS = ('statistic', 'correlat', 'relationship', 'feature', 'hypothes', 'distribut', 'importance')
+_FORMATTING_STEMS = ('format', 'table', 'structur', 'organi')
+_EXPLORATION_STEMS = ('quer', 'aggregat', 'explor', 'info', 'outlier')
+
+
+@dataclass
+class AgentRunContext:
+    """Per-run state handed to the agent tools through the SDK run context."""
+    dataframe: pd.DataFrame
+    # Content fingerprint of dataframe, keys the cached statistical summaries
+    fingerprint: str
+    # Table produced by the last data tool, so route_query can skip re-parsing its text
+    last_result: Optional[pd.DataFrame] = None
+
+
+def _read_uploaded_file(name: str, data: bytes) -> pd.DataFrame:
+    """Parse a single uploaded CSV/Excel file"""
+    if name.endswith('.csv'):
+        # Multithreaded Arrow parser; fall back to the C engine for inputs it rejects
+        try:
+            return pd.read_csv(io.BytesIO(data), engine='pyarrow')
+        except Exception:
+            # low_memory=False infers each column's dtype from the whole file, not per chunk
+            return pd.read_csv(io.BytesIO(data), low_memory=False)
+
+    # Rust-based calamine reader when python-calamine is installed, openpyxl otherwise
+    try:
+        return pd.read_excel(io.BytesIO(data), engine='calamine')
+    except ImportError:
+        return pd.read_excel(io.BytesIO(data))
+
+
+def _concat_csv_files(payloads: List[bytes]) -> Optional[pd.DataFrame]:
+    """Read CSV files as Arrow tables and concatenate them before converting to pandas"""
+    try:
+        tables = [pacsv.read_csv(pa.BufferReader(data)) for data in payloads]
+        # Permissive promotion widens e.g. int64 + double; incompatible schemas raise
+        combined = pa.concat_tables(tables, promote_options='permissive')
+    except (pa.ArrowException, ValueError):
+        return None
+    return combined.to_pandas()
+
+
+def _upload_key(files) -> tuple:
+    """Identify uploaded files by name, size and a hash of their contents"""
+    return tuple((file.name, file.size, hashlib.blake2b(file.getvalue(), digest_size=16).hexdigest())
+                 for file in files)
+
+
+def _mark_upload_changed():
+    st.session_state.upload_changed = True
+
+
+# Integer columns are narrowed to int32 only while every value is within +/-2**15.
+# Reductions are promoted to int64 either way, but element-wise arithmetic on int32
+# wraps silently past +/-2**31; this bound keeps the sum or product of any two values
+# in range, while longer running sums (e.g. cumsum) can still wrap
+_INT32_HEADROOM = 1 << 15
+
+
+def _shrink_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store integer columns as int32 where their values leave headroom. Text columns are
+    kept as Arrow-backed strings: unordered categories would reject the range
+    comparisons the filter tools make on text.
+    """
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'iu' and series.dtype.itemsize > 4:
+            if len(series) and -_INT32_HEADROOM < series.min() and series.max() < _INT32_HEADROOM:
+                df[col] = series.astype(np.int32)
+    return df
+
+
+@st.cache_data(show_spinner=False)
+def load_combined_data(key: tuple, _files):
+    """Load and combine multiple CSV/Excel files
+    
+    The cache is keyed on _upload_key(_files) alone, so Streamlit never hashes
+    the raw file contents itself.
+    """
+    names = [name for name, _, _ in key]
+    payloads = [file.getvalue() for file in _files]
+    
+    # Several CSVs with compatible schemas are concatenated column-wise in Arrow
+    if len(payloads) > 1 and all(name.endswith('.csv') for name in names):
+        combined = _concat_csv_files(payloads)
+        if combined is not None:
+            return _shrink_dtypes(combined)
+    
+    # The pandas parsers release the GIL, so files are read concurrently
+    with ThreadPoolExecutor(max_workers=min(8, len(payloads))) as executor:
+        frames = list(executor.map(_read_uploaded_file, names, payloads))
+
+    # A single upload needs no concatenation (and no copy)
+    if len(frames) == 1:
+        return _shrink_dtypes(frames[0])
+    return _shrink_dtypes(pd.concat(frames, ignore_index=True))
+
+
+def _fingerprint(dataframe: pd.DataFrame) -> str:
+    """Content hash of a dataframe (schema plus values)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((dataframe.shape, list(dataframe.columns), list(map(str, dataframe.dtypes)))).encode())
+    digest.update(pd.util.hash_pandas_object(dataframe, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _session_fingerprint(dataframe: pd.DataFrame) -> str:
+    """Fingerprint of the session dataframe, computed once per upload."""
+    if st.session_state.get('data_fingerprint') is None:
+        st.session_state.data_fingerprint = _fingerprint(dataframe)
+    return st.session_state.data_fingerprint
+
+
+def _session_column_groups(dataframe: pd.DataFrame) -> tuple:
+    """Numeric and categorical column names of the session dataframe, recomputed when its fingerprint changes."""
+    fingerprint = _session_fingerprint(dataframe)
+    if st.session_state.get('column_groups_fingerprint') != fingerprint:
+        st.session_state.numeric_cols = tuple(dataframe.select_dtypes(include=[np.number]).columns)
+        st.session_state.categorical_cols = tuple(dataframe.select_dtypes(include=['object', 'category']).columns)
+        st.session_state.column_groups_fingerprint = fingerprint
+    return st.session_state.numeric_cols, st.session_state.categorical_cols
+
+
+# Whole-frame summaries shared by the tools, route_query and the quick actions.
+# The leading underscore keeps Streamlit from hashing the frame; fp keys the cache.
+@st.cache_data(show_spinner=False)
+def _stats(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    return statistical_tools.calculate_statistics(_df)
+
+
+@st.cache_data(show_spinner=False)
+def _distribution(_df: pd.DataFrame, fp: str, column: str) -> dict:
+    """Distribution of one column, read off the cached statistics table where it covers the column"""
+    return statistical_tools.distribution_analysis(_df, column, statistics=_stats(_df, fp))
+
+
+@st.cache_data(show_spinner=False)
+def _corr(_df: pd.DataFrame, fp: str, method: str = 'pearson') -> pd.DataFrame:
+    return statistical_tools.analyze_correlations(_df, method)
+
+
+@st.cache_data(show_spinner=False)
+def _numeric_columns(_df: pd.DataFrame, fp: str) -> list:
+    return list(_df.select_dtypes(include=[np.number]).columns)
 
 
-@st.cache_data
-def load_combined_data(files):
-    """Load and combine multiple CSV/Excel files"""
-    combined_df = pd.DataFrame()
-    for file in files:
-        if file.name.endswith('.csv'):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-        combined_df = pd.concat([combined_df, df], ignore_index=True)
-    return combined_df
+@st.cache_data(show_spinner=False)
+def _histogram(_df: pd.DataFrame, fp: str, column: str, bins: int):
+    return visualization_tools.histogram_counts(_df, column, bins)
+
+
+@st.cache_data(show_spinner=False)
+def _value_counts(_df: pd.DataFrame, fp: str, column: str) -> pd.Series:
+    return _df[column].value_counts()
+
+
+@st.cache_data(show_spinner=False)
+def _rel(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    return statistical_tools.feature_relationships(_df)
+
+
+@st.cache_data(show_spinner=False)
+def _describe(_df: pd.DataFrame, fp: str, cols: tuple) -> pd.DataFrame:
+    return _df[list(cols)].describe(percentiles=[.25, .5, .75, .9, .95, .99]).T
+
+
+@st.cache_data(show_spinner=False)
+def _summary(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    return _df.describe()
+
+
+@st.cache_data(show_spinner=False)
+def _info(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    # Read off the cached quality summary rather than scanning the frame again
+    quality = _quality(_df, fp).set_index('Column').rename_axis(None)
+    return pd.DataFrame({'dtype': quality['Data Type'], 'nulls': quality['Null Count'],
+                         'unique': quality['Unique Values']})
+
+
+@st.cache_data(show_spinner=False)
+def _nulls(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    quality = _quality(_df, fp).set_index('Column').rename_axis(None)
+    quality = quality[quality['Null Count'] > 0]
+    return pd.DataFrame({'Missing Count': quality['Null Count'], 'Percentage': quality['Null Percentage'].round(2)})
+
+
+@st.cache_data(show_spinner=False)
+def _iqr_bounds(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    return data_tools.iqr_bounds(_df)
+
+
+@st.cache_data(show_spinner=False)
+def _outliers(_df: pd.DataFrame, fp: str, column: str) -> pd.DataFrame:
+    """Rows outside 1.5 IQR of column; the fences of all numeric columns are computed once"""
+    return data_tools.detect_outliers(_df, column, 'iqr', bounds=_iqr_bounds(_df, fp))
+
+
+@st.cache_data(show_spinner=False)
+def _quality(_df: pd.DataFrame, fp: str) -> pd.DataFrame:
+    return data_tools.get_data_quality_summary(_df)
+
+
+@st.cache_data(show_spinner=False)
+def _mem_mb(_df: pd.DataFrame, fp: str) -> float:
+    return _df.memory_usage(deep=True).sum() / (1024**2)
+
+
+def _infer_column_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert parsed string columns to numeric or, when low-cardinality, categorical dtypes."""
+    for col in df.columns:
+        try:
+            numeric = pd.to_numeric(df[col], errors='coerce')
+            # Blank and 'NaN' cells are missing values, not evidence of a text column
+            blank = df[col].isin(('', 'nan', 'NaN', 'None'))
+            if not blank.all() and numeric[~blank].notna().all():
+                df[col] = numeric
+            elif df[col].nunique() < len(df) * 0.5:
+                df[col] = df[col].astype('category')
+        except Exception:
+            pass
+    return df
 
 
 def parse_text_to_dataframe(text: str, dataframe: pd.DataFrame) -> Optional[pd.DataFrame]:
@@ -52,22 +293,21 @@ def parse_text_to_dataframe(text: str, dataframe: pd.DataFrame) -> Optional[pd.D
     
     try:
         # Try to find pipe-separated tables (common in text output)
-        # Pattern: lines with | separators
-        lines = text.split('\n')
+        # Pattern: lines with | separators, scanned with vectorized string ops
+        lines = np.asarray(text.split('\n'))
+        stripped = np.char.strip(lines)
+        is_pipe = np.char.startswith(stripped, '|')
         table_lines = []
-        in_table = False
         
-        for line in lines:
-            if '|' in line and line.strip().startswith('|'):
-                table_lines.append(line)
-                in_table = True
-            elif in_table and (not line.strip() or '---' in line):
-                if '---' in line:
-                    continue  # Skip separator lines
-                if not line.strip():
-                    break  # End of table
-            elif in_table:
-                break
+        if is_pipe.any():
+            start = int(np.argmax(is_pipe))
+            # The table runs until the first line that is neither a pipe row nor a '---' separator
+            in_table = is_pipe[start:] | (np.char.find(lines[start:], '---') >= 0)
+            outside = np.flatnonzero(~in_table)
+            end = start + (int(outside[0]) if outside.size else in_table.size)
+            # Skip markdown separator rows such as |---|:---:|
+            is_row = is_pipe[start:end] & (np.char.strip(stripped[start:end], '|:- ') != '')
+            table_lines = lines[start:end][is_row].tolist()
         
         if table_lines:
             # Parse pipe-separated table
@@ -75,9 +315,14 @@ def parse_text_to_dataframe(text: str, dataframe: pd.DataFrame) -> Optional[pd.D
                 # Clean up the lines
                 cleaned_lines = []
                 for line in table_lines:
-                    # Remove leading/trailing pipes and split
-                    parts = [p.strip() for p in line.strip().strip('|').split('|')]
-                    if parts and any(p for p in parts):  # Skip empty lines
+                    # Remove leading/trailing pipes and split, stripping cells in place
+                    parts = line.strip().strip('|').split('|')
+                    has_content = False
+                    for i in range(len(parts)):
+                        cell = parts[i].strip()
+                        parts[i] = cell
+                        has_content = has_content or bool(cell)
+                    if has_content:  # Skip empty lines
                         cleaned_lines.append(parts)
                 
                 if cleaned_lines and len(cleaned_lines) > 1:
@@ -85,27 +330,31 @@ def parse_text_to_dataframe(text: str, dataframe: pd.DataFrame) -> Optional[pd.D
                     headers = cleaned_lines[0]
                     data_rows = cleaned_lines[1:]
                     
-                    # Create DataFrame
+                    # Create DataFrame (cleaned_lines already excludes empty rows)
                     if headers and data_rows:
-                        # Filter out empty rows
-                        data_rows = [row for row in data_rows if any(cell for cell in row)]
-                        if data_rows:
-                            # Pad rows to match header length
-                            max_cols = len(headers)
-                            padded_rows = [row + [''] * (max_cols - len(row)) for row in data_rows]
-                            df = pd.DataFrame(padded_rows, columns=headers[:max_cols])
-                            # Remove completely empty columns
-                            df = df.loc[:, (df != '').any(axis=0)]
-                            if not df.empty:
-                                return df
+                        # Fill a header-width cell buffer; short rows keep '' padding
+                        max_cols = len(headers)
+                        cells = np.full((len(data_rows), max_cols), '', dtype=object)
+                        # Track which columns hold any content while filling, so
+                        # completely empty columns can be dropped without a rescan
+                        col_has_content = [False] * max_cols
+                        for i, row in enumerate(data_rows):
+                            for j, cell in enumerate(row[:max_cols]):
+                                if cell:
+                                    cells[i, j] = cell
+                                    col_has_content[j] = True
+                        keep = np.fromiter(col_has_content, dtype=bool, count=max_cols)
+                        df = pd.DataFrame(cells[:, keep], columns=np.asarray(headers, dtype=object)[keep])
+                        if not df.empty:
+                            return _infer_column_types(df)
             except Exception:
                 pass
         
         # Try to extract correlation results
-        if 'correlation' in text.lower() or 'pearson' in text.lower():
+        text_lower = text.lower()
+        if 'correlation' in text_lower or 'pearson' in text_lower:
             # Look for correlation coefficient patterns
-            corr_pattern = r'(\w+)\s+and\s+(\w+)[:\s]+([-]?\d+\.?\d*)'
-            matches = re.findall(corr_pattern, text, re.IGNORECASE)
+            matches = _CORR_RE.findall(text)
             if matches:
                 rows = []
                 for match in matches:
@@ -117,44 +366,74 @@ def parse_text_to_dataframe(text: str, dataframe: pd.DataFrame) -> Optional[pd.D
                 if rows:
                     return pd.DataFrame(rows)
         
+        # Try to parse as CSV if it looks like CSV data (tool payloads are CSV)
+        if ',' in text and '\n' in text:
+            csv_text = text.strip()
+            first_line, _, rest = csv_text.partition('\n')
+            # Skip a title line such as "Query Results (N rows):"
+            if ',' not in first_line and first_line.rstrip().endswith(':'):
+                csv_text = rest
+                first_line = rest.partition('\n')[0]
+            # Drop the truncation footer added by _fmt
+            csv_text = _FOOTER_RE.sub('', csv_text)
+            # Check if it looks like CSV (at least 2 lines, consistent commas)
+            if '\n' in csv_text:
+                first_line_commas = first_line.count(',')
+                if first_line_commas > 0:
+                    try:
+                        df = pd.read_csv(io.StringIO(csv_text))
+                        if not df.empty and len(df.columns) > 1:
+                            return df
+                    except:
+                        pass
+        
         # Try to find DataFrame-like structures in the text
         # Look for patterns like "Query Results (N rows):" followed by data
-        if 'query results' in text.lower() or 'rows' in text.lower():
+        if 'query results' in text_lower:
             # Try to extract data after "Query Results" or similar
-            parts = re.split(r'query results.*?rows?[:\s]*', text, flags=re.IGNORECASE)
+            parts = _QUERY_RESULTS_RE.split(text)
             if len(parts) > 1:
                 data_part = parts[1].strip()
-                # Try to parse as CSV-like data
+                # Whitespace-separated output (e.g. DataFrame.to_string) splits directly
+                rows = [line.split() for line in data_part.splitlines() if line.strip()]
+                if len(rows) >= 2:
+                    header = rows[0]
+                    widths = {len(row) for row in rows[1:]}
+                    if widths == {len(header)}:
+                        return _infer_column_types(pd.DataFrame(rows[1:], columns=header))
+                    if widths == {len(header) + 1}:
+                        # to_string() output: the first token of every row is the index
+                        return _infer_column_types(pd.DataFrame([row[1:] for row in rows[1:]], columns=header,
+                                                                 index=[row[0] for row in rows[1:]]))
+                # Ragged rows (values with spaces, missing cells): use the C whitespace parser
                 try:
-                    df = pd.read_csv(io.StringIO(data_part), sep=r'\s+', engine='python')
+                    df = pd.read_csv(io.StringIO(data_part), sep=r'\s+')
                     if not df.empty:
                         return df
                 except:
                     pass
         
-        # Try to parse as CSV if it looks like CSV data
-        if ',' in text and '\n' in text:
-            lines = text.split('\n')
-            # Check if it looks like CSV (at least 2 lines, consistent commas)
-            if len(lines) >= 2:
-                first_line_commas = lines[0].count(',')
-                if first_line_commas > 0:
-                    try:
-                        df = pd.read_csv(io.StringIO(text))
-                        if not df.empty and len(df.columns) > 1:
-                            return df
-                    except:
-                        pass
-        
         return None
     except Exception:
         return None
 
 
+def _top_n(dataframe: pd.DataFrame, column: str, n: int, ascending: bool = True) -> pd.DataFrame:
+    """First n rows ordered by column, using a partial selection instead of a full sort when possible."""
+    # nlargest/nsmallest only handle numeric columns and drop NaNs, which sort_values keeps at the end
+    if pd.api.types.is_numeric_dtype(dataframe[column]) and dataframe[column].count() >= n:
+        return dataframe.nsmallest(n, column) if ascending else dataframe.nlargest(n, column)
+    return dataframe.sort_values(by=column, ascending=ascending).head(n)
+
+
 def extract_dataframe_from_result(result_text: str, dataframe: pd.DataFrame, query: str = "") -> Optional[pd.DataFrame]:
     """
     Try multiple methods to extract a DataFrame from result text.
     """
+    # Empty replies and tool errors carry no table
+    if not result_text or len(result_text) < 8 or result_text.startswith('Error:'):
+        return None
+    
     # First try parsing text
     df = parse_text_to_dataframe(result_text, dataframe)
     if df is not None and not df.empty:
@@ -169,104 +448,125 @@ def extract_dataframe_from_result(result_text: str, dataframe: pd.DataFrame, que
         pass
     
     # For query results, try to execute the query directly if it's a simple query
+    if not query:
+        return None
     query_lower = query.lower()
     if any(word in query_lower for word in ['order by', 'sort', 'filter', 'group by', 'top', 'first', 'limit']):
         try:
             # Try to execute the query using data_tools
             if 'order by' in query_lower or 'sort' in query_lower:
                 # Extract column name
-                match = re.search(r'(?:order by|sort by)\s+(\w+)', query_lower)
+                match = _ORDER_BY_RE.search(query_lower)
                 if match:
                     col = match.group(1)
                     # Check if column exists
                     if col in dataframe.columns:
                         direction = 'desc' if 'desc' in query_lower else 'asc'
-                        result_df = dataframe.sort_values(by=col, ascending=(direction == 'asc'))
                         # Check for limit
-                        limit_match = re.search(r'limit\s+(\d+)', query_lower)
+                        limit_match = _LIMIT_RE.search(query_lower)
                         if limit_match:
-                            limit = int(limit_match.group(1))
-                            result_df = result_df.head(limit)
-                        return result_df
+                            return _top_n(dataframe, col, int(limit_match.group(1)), direction == 'asc')
+                        return dataframe.sort_values(by=col, ascending=(direction == 'asc'))
         except:
             pass
     
     return None
 
 
+def _coerce(value: str) -> Union[str, float]:
+    """Interpret a filter value as a number when possible."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# Tool payloads are CSV (fast to serialize, re-parseable) and capped to bound token cost
+def _fmt(df: pd.DataFrame, n: int = 100) -> str:
+    """Serialize a tool result table for the LLM, noting how many rows were left out."""
+    payload = df.head(n).to_csv(index=False)
+    if len(df) > n:
+        payload += f"(showing first {n} of {len(df)} rows)\n"
+    return payload
+
+
 def create_agents(dataframe: pd.DataFrame, model_name: Optional[str] = None):
     """
     Create all specialized agents with their tools.
     
+    Agents only depend on the dataframe schema; the data itself is passed to the
+    tools through the run context (see route_query), so agents are shared across
+    reruns and sessions for the same columns, dtypes and model.
+    
     Args:
         dataframe: The dataframe to analyze
         model_name: Optional model name (defaults to OpenAI, can be 'gpt-4o', 'gpt-4o-mini', etc.)
     """
+    return _build_agents(tuple(dataframe.columns), tuple(map(str, dataframe.dtypes)), model_name)
+
+
+@st.cache_resource(show_spinner="Initializing specialized agents...")
+def _build_agents(columns: tuple, dtypes: tuple, model_name: Optional[str] = None):
+    """Build the agent graph for a dataframe schema."""
     
     # Analysis Agent - Data exploration and querying with SQL-like operations
     @function_tool
-    def query_data(query: str) -> str:
+    def query_data(ctx: RunContextWrapper[AgentRunContext], query: str) -> str:
         """Query the dataframe using natural language. Supports SQL-like operations: ORDER BY, GROUP BY, WHERE, LIMIT."""
+        dataframe = ctx.context.dataframe
         try:
             # Try complex query first
             result = data_tools.execute_complex_query(dataframe, query)
             if not result.empty:
-                return f"Query Results ({len(result)} rows):\n{result.to_string()}"
+                ctx.context.last_result = result
+                return f"Query Results ({len(result)} rows):\n{_fmt(result)}"
             # Fallback to simple query
-            return data_tools.query_dataframe(query, dataframe)
+            return data_tools.query_dataframe(query, dataframe, summary=_summary(dataframe, ctx.context.fingerprint))
         except Exception as e:
             return f"Error: {str(e)}. Available columns: {list(dataframe.columns)}"
     
     @function_tool
-    def filter_data(column: str, condition: str, value: Union[str, float, int]) -> str:
+    def filter_data(ctx: RunContextWrapper[AgentRunContext], column: str, condition: str, value: Union[str, float, int]) -> str:
         """Filter data. Conditions: 'greater', 'less', 'equal', 'contains', 'between'."""
+        dataframe = ctx.context.dataframe
         try:
             filtered = data_tools.filter_dataframe(column, condition, value, dataframe)
-            return f"Filtered {len(filtered)} rows:\n{filtered.to_string()}"
+            ctx.context.last_result = filtered
+            return f"Filtered {len(filtered)} rows:\n{_fmt(filtered)}"
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def multi_filter(conditions: str, logic: str = 'AND') -> str:
+    def multi_filter(ctx: RunContextWrapper[AgentRunContext], conditions: str, logic: str = 'AND') -> str:
         """Apply multiple filter conditions. Conditions format: 'column1>30,column2==value'. Logic: 'AND' or 'OR'."""
+        dataframe = ctx.context.dataframe
         try:
-            # Parse conditions string
-            cond_list = []
-            for cond_str in conditions.split(','):
-                parts = cond_str.strip().split('>')
-                if len(parts) == 2:
-                    cond_list.append({'column': parts[0].strip(), 'operator': '>', 'value': float(parts[1].strip())})
-                elif '<' in cond_str:
-                    parts = cond_str.split('<')
-                    cond_list.append({'column': parts[0].strip(), 'operator': '<', 'value': float(parts[1].strip())})
-                elif '==' in cond_str:
-                    parts = cond_str.split('==')
-                    val = parts[1].strip()
-                    try:
-                        val = float(val)
-                    except:
-                        pass
-                    cond_list.append({'column': parts[0].strip(), 'operator': '==', 'value': val})
+            # Parse conditions string in one regex pass
+            cond_list = [{'column': m[1], 'operator': m[2], 'value': _coerce(m[3].strip())}
+                         for m in _COND_RE.finditer(conditions)]
             
             if cond_list:
                 filtered = data_tools.multi_condition_filter(dataframe, cond_list, logic)
-                return f"Filtered {len(filtered)} rows:\n{filtered.to_string()}"
+                ctx.context.last_result = filtered
+                return f"Filtered {len(filtered)} rows:\n{_fmt(filtered)}"
             return "No valid conditions provided"
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def group_by_aggregate(group_by: str, agg_function: str, agg_column: Optional[str] = None) -> str:
+    def group_by_aggregate(ctx: RunContextWrapper[AgentRunContext], group_by: str, agg_function: str, agg_column: Optional[str] = None) -> str:
         """Group by a column and aggregate. Functions: 'sum', 'mean', 'count', 'max', 'min', 'std'."""
+        dataframe = ctx.context.dataframe
         try:
             result = data_tools.group_by_aggregate(dataframe, group_by, agg_function, agg_column)
-            return result.to_string()
+            return _fmt(result)
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def advanced_group_by(group_by: str, aggregations: str) -> str:
+    def advanced_group_by(ctx: RunContextWrapper[AgentRunContext], group_by: str, aggregations: str) -> str:
         """Advanced group by with multiple aggregations. Format: 'column1:mean,column2:sum'."""
+        dataframe = ctx.context.dataframe
         try:
             agg_dict = {}
             for agg_str in aggregations.split(','):
@@ -275,25 +575,28 @@ def create_agents(dataframe: pd.DataFrame, model_name: Optional[str] = None):
                     agg_dict[col.strip()] = func.strip()
             
             result = data_tools.advanced_group_by(dataframe, group_by, agg_dict)
-            return result.to_string()
+            return _fmt(result)
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def order_by(column: str, direction: str = 'asc') -> str:
+    def order_by(ctx: RunContextWrapper[AgentRunContext], column: str, direction: str = 'asc') -> str:
         """Sort data by a column. Direction: 'asc' or 'desc'."""
+        dataframe = ctx.context.dataframe
         try:
             if column not in dataframe.columns:
                 return f"Column '{column}' not found. Available: {list(dataframe.columns)}"
             ascending = direction.lower() == 'asc'
-            sorted_df = dataframe.sort_values(by=column, ascending=ascending)
-            return f"Sorted by {column} ({direction}):\n{sorted_df.head(50).to_string()}"
+            sorted_df = _top_n(dataframe, column, 50, ascending)
+            ctx.context.last_result = sorted_df
+            return f"Sorted by {column} ({direction}):\n{_fmt(sorted_df)}"
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def get_data_info() -> str:
+    def get_data_info(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Get comprehensive information about the dataset."""
+        dataframe = ctx.context.dataframe
         info = data_tools.get_data_info(dataframe)
         return f"""Dataset Information:
 - Shape: {info['shape']}
@@ -305,37 +608,43 @@ def create_agents(dataframe: pd.DataFrame, model_name: Optional[str] = None):
 - Memory usage: {info['memory_usage_mb']:.2f} MB"""
     
     @function_tool
-    def get_data_quality() -> str:
+    def get_data_quality(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Get comprehensive data quality summary including missing values, nulls, duplicates, completeness."""
+        dataframe = ctx.context.dataframe
         try:
-            quality_df = data_tools.get_data_quality_summary(dataframe)
-            return f"Data Quality Summary:\n{quality_df.to_string()}"
+            quality_df = _quality(dataframe, ctx.context.fingerprint)
+            # Percentages are kept exact in the table; two decimals are plenty for the model
+            return f"Data Quality Summary:\n{_fmt(quality_df.round(2))}"
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def detect_outliers(column: str, method: str = 'iqr') -> str:
+    def detect_outliers(ctx: RunContextWrapper[AgentRunContext], column: str, method: str = 'iqr') -> str:
         """Detect outliers in a column. Methods: 'iqr' or 'zscore'."""
+        dataframe = ctx.context.dataframe
         try:
-            outliers = data_tools.detect_outliers(dataframe, column, method)
-            return f"Found {len(outliers)} outliers:\n{outliers.to_string()}"
+            bounds = _iqr_bounds(dataframe, ctx.context.fingerprint) if method.lower() == 'iqr' else None
+            outliers = data_tools.detect_outliers(dataframe, column, method, bounds=bounds)
+            return f"Found {len(outliers)} outliers:\n{_fmt(outliers)}"
         except Exception as e:
             return f"Error: {str(e)}"
     
     @function_tool
-    def execute_sql_query(query_description: str) -> str:
+    def execute_sql_query(ctx: RunContextWrapper[AgentRunContext], query_description: str) -> str:
         """Execute SQL-like queries. Supports: SELECT, WHERE, GROUP BY, ORDER BY, LIMIT.
         Example: 'SELECT age, salary WHERE age > 30 ORDER BY salary DESC LIMIT 10'"""
+        dataframe = ctx.context.dataframe
         try:
             result = data_tools.execute_complex_query(dataframe, query_description)
-            return f"Query Results ({len(result)} rows):\n{result.to_string()}"
+            ctx.context.last_result = result
+            return f"Query Results ({len(result)} rows):\n{_fmt(result)}"
         except Exception as e:
             return f"Error: {str(e)}. Available columns: {list(dataframe.columns)}"
     
     analysis_agent = Agent(
         name="Analysis Agent",
         instructions=f"""You are an expert data analyst with comprehensive SQL and pandas knowledge.
-You have access to a dataframe with columns: {list(dataframe.columns)}.
+You have access to a dataframe with columns: {list(columns)}.
 
 Your capabilities:
 - Execute complex queries with ORDER BY, GROUP BY, WHERE, LIMIT
@@ -365,32 +674,36 @@ Use the appropriate tools to execute these operations. Always provide clear, str
     
     # Statistical Agent - Advanced statistics and feature relationships
     @function_tool
-    def calculate_statistics() -> str:
+    def calculate_statistics(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Calculate comprehensive descriptive statistics for all numeric columns."""
-        stats_df = statistical_tools.calculate_statistics(dataframe)
+        dataframe = ctx.context.dataframe
+        stats_df = _stats(dataframe, ctx.context.fingerprint)
         if stats_df.empty:
             return "No numeric columns found for statistical analysis."
         return f"Statistical Summary:\n{stats_df.to_string()}"
     
     @function_tool
-    def analyze_correlations(method: str = 'pearson') -> str:
+    def analyze_correlations(ctx: RunContextWrapper[AgentRunContext], method: str = 'pearson') -> str:
         """Analyze correlations between numeric features. Methods: 'pearson', 'spearman', 'kendall'."""
-        corr_df = statistical_tools.analyze_correlations(dataframe, method)
+        dataframe = ctx.context.dataframe
+        corr_df = _corr(dataframe, ctx.context.fingerprint, method)
         if corr_df.empty:
             return "Need at least 2 numeric columns for correlation analysis."
         return f"Correlation Matrix ({method}):\n{corr_df.to_string()}"
     
     @function_tool
-    def feature_relationships() -> str:
+    def feature_relationships(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Analyze relationships between all feature pairs, including correlations and dependencies."""
-        relationships_df = statistical_tools.feature_relationships(dataframe)
+        dataframe = ctx.context.dataframe
+        relationships_df = _rel(dataframe, ctx.context.fingerprint)
         if relationships_df.empty:
             return "No relationships found. Need numeric or categorical columns."
-        return f"Feature Relationships:\n{relationships_df.to_string()}"
+        return f"Feature Relationships:\n{_fmt(relationships_df)}"
     
     @function_tool
-    def hypothesis_test(column: str, test_type: str = 'ttest', value: Optional[float] = None) -> str:
+    def hypothesis_test(ctx: RunContextWrapper[AgentRunContext], column: str, test_type: str = 'ttest', value: Optional[float] = None) -> str:
         """Perform hypothesis testing. Test types: 'ttest', 'normality'."""
+        dataframe = ctx.context.dataframe
         try:
             result = statistical_tools.hypothesis_test(dataframe, column, test_type, value)
             return f"Hypothesis Test Results:\n{result}"
@@ -398,10 +711,11 @@ Use the appropriate tools to execute these operations. Always provide clear, str
             return f"Error: {str(e)}"
     
     @function_tool
-    def distribution_analysis(column: str) -> str:
+    def distribution_analysis(ctx: RunContextWrapper[AgentRunContext], column: str) -> str:
         """Analyze the distribution of a column including skewness, kurtosis, percentiles."""
+        dataframe = ctx.context.dataframe
         try:
-            analysis = statistical_tools.distribution_analysis(dataframe, column)
+            analysis = _distribution(dataframe, ctx.context.fingerprint, column)
             result = f"""Distribution Analysis for {column}:
 - Mean: {analysis['mean']:.4f}
 - Median: {analysis['median']:.4f}
@@ -416,8 +730,9 @@ Use the appropriate tools to execute these operations. Always provide clear, str
             return f"Error: {str(e)}"
     
     @function_tool
-    def feature_importance(target_column: str) -> str:
+    def feature_importance(ctx: RunContextWrapper[AgentRunContext], target_column: str) -> str:
         """Calculate feature importance based on correlation with target column."""
+        dataframe = ctx.context.dataframe
         try:
             importance_df = statistical_tools.feature_importance(dataframe, target_column)
             if importance_df.empty:
@@ -429,7 +744,7 @@ Use the appropriate tools to execute these operations. Always provide clear, str
     statistical_agent = Agent(
         name="Statistical Agent",
         instructions=f"""You are a statistical analysis expert specializing in advanced statistics and feature relationships.
-You have access to a dataframe with columns: {list(dataframe.columns)}.
+You have access to a dataframe with columns: {list(columns)}.
 
 Your capabilities:
 - Calculate comprehensive statistics
@@ -446,44 +761,57 @@ Always provide statistical insights and explain what the results mean. Focus on
     
     # Visualization Agent - Create charts and visualizations
     @function_tool
-    def create_histogram(column: str, bins: int = 30) -> str:
+    def create_histogram(ctx: RunContextWrapper[AgentRunContext], column: str, bins: int = 30) -> str:
         """Create a histogram to show distribution of a column."""
-        return visualization_tools.create_histogram(dataframe, column, bins)
+        dataframe = ctx.context.dataframe
+        counts = _histogram(dataframe, ctx.context.fingerprint, column, bins) if column in dataframe.columns else None
+        return visualization_tools.create_histogram(dataframe, column, bins, counts=counts)
     
     @function_tool
-    def create_scatter(x_column: str, y_column: str) -> str:
+    def create_scatter(ctx: RunContextWrapper[AgentRunContext], x_column: str, y_column: str) -> str:
         """Create a scatter plot to show relationship between two columns."""
+        dataframe = ctx.context.dataframe
         return visualization_tools.create_scatter(dataframe, x_column, y_column)
     
     @function_tool
-    def create_correlation_heatmap() -> str:
+    def create_correlation_heatmap(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Create a correlation heatmap showing relationships between all numeric features."""
-        return visualization_tools.create_correlation_heatmap(dataframe)
+        dataframe, fp = ctx.context.dataframe, ctx.context.fingerprint
+        # Only the drawing runs per call; the matrix and column names come from the per-fingerprint cache
+        return visualization_tools.create_correlation_heatmap(dataframe, corr=_corr(dataframe, fp),
+                                                              numeric_cols=_numeric_columns(dataframe, fp))
     
     @function_tool
-    def create_bar_chart(column: str, top_n: int = 20) -> str:
+    def create_bar_chart(ctx: RunContextWrapper[AgentRunContext], column: str, top_n: int = 20) -> str:
         """Create a bar chart for a categorical column."""
-        return visualization_tools.create_bar_chart(dataframe, column, top_n)
+        dataframe = ctx.context.dataframe
+        counts = _value_counts(dataframe, ctx.context.fingerprint, column) if column in dataframe.columns else None
+        return visualization_tools.create_bar_chart(dataframe, column, top_n, counts=counts)
     
     @function_tool
-    def create_box_plot(column: Optional[str] = None) -> str:
+    def create_box_plot(ctx: RunContextWrapper[AgentRunContext], column: Optional[str] = None) -> str:
         """Create a box plot to show distribution and outliers."""
-        return visualization_tools.create_box_plot(dataframe, column)
+        dataframe = ctx.context.dataframe
+        return visualization_tools.create_box_plot(dataframe, column,
+                                                   numeric_cols=_numeric_columns(dataframe, ctx.context.fingerprint))
     
     @function_tool
-    def create_line_plot(x_column: str, y_column: str) -> str:
+    def create_line_plot(ctx: RunContextWrapper[AgentRunContext], x_column: str, y_column: str) -> str:
         """Create a line plot for time series or sequential data."""
+        dataframe = ctx.context.dataframe
         return visualization_tools.create_line_plot(dataframe, x_column, y_column)
     
     @function_tool
-    def create_pair_plot(columns: Optional[List[str]] = None) -> str:
+    def create_pair_plot(ctx: RunContextWrapper[AgentRunContext], columns: Optional[List[str]] = None) -> str:
         """Create a pair plot showing relationships between multiple numeric columns."""
-        return visualization_tools.create_pair_plot(dataframe, columns)
+        dataframe = ctx.context.dataframe
+        return visualization_tools.create_pair_plot(dataframe, columns,
+                                                    numeric_cols=_numeric_columns(dataframe, ctx.context.fingerprint))
     
     visualization_agent = Agent(
         name="Visualization Agent",
         instructions=f"""You are a data visualization expert specializing in creating insightful charts and graphs.
-You have access to a dataframe with columns: {list(dataframe.columns)}.
+You have access to a dataframe with columns: {list(columns)}.
 
 Your capabilities:
 - Create histograms for distributions
@@ -507,35 +835,38 @@ Always choose the most appropriate visualization type for the data and question.
         return f"Formatted Table:\n{table_df.to_string()}"
     
     @function_tool
-    def create_summary_table() -> str:
+    def create_summary_table(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Create a formatted summary statistics table from the current dataframe."""
-        stats_df = statistical_tools.calculate_statistics(dataframe)
+        dataframe = ctx.context.dataframe
+        stats_df = _stats(dataframe, ctx.context.fingerprint)
         if stats_df.empty:
             return "No statistics available to format."
         return f"Summary Statistics Table:\n{stats_df.to_string()}"
     
     @function_tool
-    def format_correlation_table() -> str:
+    def format_correlation_table(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Format correlation matrix into a readable table format."""
-        corr_matrix = statistical_tools.analyze_correlations(dataframe)
+        dataframe = ctx.context.dataframe
+        corr_matrix = _corr(dataframe, ctx.context.fingerprint)
         if corr_matrix.empty:
             return "No correlations to format."
         table_df = formatting_tools.format_correlation_table(corr_matrix)
         return f"Correlation Table:\n{table_df.to_string()}"
     
     @function_tool
-    def format_insights() -> str:
+    def format_insights(ctx: RunContextWrapper[AgentRunContext]) -> str:
         """Format insights into a structured table. Analyzes the dataframe and creates an insights table."""
+        dataframe = ctx.context.dataframe
         # Get feature relationships as insights
-        relationships_df = statistical_tools.feature_relationships(dataframe)
+        relationships_df = _rel(dataframe, ctx.context.fingerprint)
         if relationships_df.empty:
             return "No insights available to format."
-        return f"Insights Table:\n{relationships_df.to_string()}"
+        return f"Insights Table:\n{_fmt(relationships_df)}"
     
     formatting_agent = Agent(
         name="Formatting Agent",
         instructions=f"""You are a formatting expert specializing in structuring data and insights into readable table formats.
-You have access to a dataframe with columns: {list(dataframe.columns)}.
+You have access to a dataframe with columns: {list(columns)}.
 
 Your capabilities:
 - Convert any data to table format
@@ -566,7 +897,7 @@ Based on the user's query, determine which agent(s) should handle it:
 
 For complex queries, you may need to coordinate multiple agents. Always ensure results are properly formatted in tables when possible.
 
-The dataframe has columns: {list(dataframe.columns)}""",
+The dataframe has columns: {list(columns)}""",
         tools=[]  # Orchestrator uses handoffs instead of tools
     )
     
@@ -579,30 +910,30 @@ The dataframe has columns: {list(dataframe.columns)}""",
     }
 
 
-def route_query(query: str, agents: Dict[str, Agent], dataframe: pd.DataFrame) -> tuple:
-    """
-    Route query to appropriate agent(s) and return results.
-    Returns: (agent_name, result_text, result_table)
-    """
+def _mentions(tokens: set, stems: tuple) -> bool:
+    """Whether any query token starts with one of the stems"""
+    return any(token.startswith(stems) for token in tokens)
+
+
+def _select_agent(query: str, agents: Dict[str, Agent]) -> tuple:
+    """Pick the agent for a query. Returns: (agent_name, agent)"""
     query_lower = query.lower()
     
     # Determine which agent to use - prioritize SQL-like operations for Analysis Agent
-    if any(word in query_lower for word in ['order by', 'sort by', 'group by', 'where', 'limit', 
-                                             'select', 'filter', 'top', 'first']):
+    tokens = set(_WORD_RE.findall(query_lower))
+    if _mentions(tokens, _ANALYSIS_STEMS) or any(phrase in query_lower for phrase in _ANALYSIS_PHRASES):
         agent_name = 'analysis'
         agent = agents['analysis']
-    elif any(word in query_lower for word in ['plot', 'chart', 'graph', 'visualize', 'histogram', 
-                                            'scatter', 'bar', 'heatmap', 'box plot', 'line plot']):
+    elif _mentions(tokens, _VISUALIZATION_STEMS):
         agent_name = 'visualization'
         agent = agents['visualization']
-    elif any(word in query_lower for word in ['statistic', 'correlation', 'relationship', 
-                                               'feature', 'hypothesis', 'distribution', 'importance']):
+    elif _mentions(tokens, _STATISTICAL_STEMS):
         agent_name = 'statistical'
         agent = agents['statistical']
-    elif any(word in query_lower for word in ['format', 'table', 'structure', 'organize']):
+    elif _mentions(tokens, _FORMATTING_STEMS):
         agent_name = 'formatting'
         agent = agents['formatting']
-    elif any(word in query_lower for word in ['query', 'aggregate', 'explore', 'info', 'outlier']):
+    elif _mentions(tokens, _EXPLORATION_STEMS):
         agent_name = 'analysis'
         agent = agents['analysis']
     else:
@@ -610,52 +941,312 @@ def route_query(query: str, agents: Dict[str, Agent], dataframe: pd.DataFrame) -
         agent_name = 'analysis'
         agent = agents['analysis']
     
-    try:
-        result = Runner.run_sync(agent, query)
-        result_text = result.final_output
-        
-        # Try to extract table from result - ALWAYS try to extract tabular data
+    return agent_name, agent
+
+
+def _collect_results(agent_name: str, query: str, result_text: str,
+                     run_context: AgentRunContext, dataframe: pd.DataFrame) -> tuple:
+    """Turn a finished agent run into (agent_name, result_text, result_table)."""
+    query_lower = query.lower()
+    
+    # Prefer the table a data tool produced directly over re-parsing the reply
+    result_table = run_context.last_result
+    if result_table is not None and result_table.empty:
         result_table = None
-        
-        # First, try the enhanced extraction function
+    
+    # Otherwise, try the enhanced extraction function
+    if result_table is None:
         result_table = extract_dataframe_from_result(result_text, dataframe, query)
-        
-        # If that didn't work, try formatting tools
-        if result_table is None or result_table.empty:
+    
+    # For statistical/correlation queries, try to get actual data
+    if (result_table is None or result_table.empty) and agent_name == 'statistical':
+        if 'correlation' in query_lower:
+            try:
+                numeric_cols, _ = _session_column_groups(dataframe)
+                if len(numeric_cols) >= 2:
+                    corr_df = _corr(dataframe, run_context.fingerprint)
+                    if not corr_df.empty:
+                        result_table = corr_df
+            except:
+                pass
+        elif 'statistic' in query_lower or 'summary' in query_lower:
+            try:
+                stats_df = _stats(dataframe, run_context.fingerprint)
+                if not stats_df.empty:
+                    result_table = stats_df
+            except:
+                pass
+        elif 'relationship' in query_lower or 'feature' in query_lower:
             try:
-                result_table = formatting_tools.format_as_table(result_text)
+                rel_df = _rel(dataframe, run_context.fingerprint)
+                if not rel_df.empty:
+                    result_table = rel_df
             except:
                 pass
+    
+    return agent_name, result_text, result_table
+
+
+def _answer_key(query: str, dataframe: pd.DataFrame) -> tuple:
+    return query.strip(), _session_fingerprint(dataframe)
+
+
+def _remember_answer(key: tuple, result: tuple) -> tuple:
+    """
+    Keep a finished answer for this session's data so repeating the query skips the
+    agent run. Errors are not kept, and neither are charts: they are drawn while the
+    visualization tools run, so a stored reply would come back without its figure.
+    """
+    agent_name, result_text, _ = result
+    if agent_name != 'visualization' and not str(result_text).startswith("Error:"):
+        st.session_state.setdefault('agent_answers', {})[key] = result
+    return result
+
+
+def route_query(query: str, agents: Dict[str, Agent], dataframe: pd.DataFrame) -> tuple:
+    """
+    Route query to appropriate agent(s) and return results.
+    Returns: (agent_name, result_text, result_table)
+    """
+    key = _answer_key(query, dataframe)
+    cached = st.session_state.get('agent_answers', {}).get(key)
+    if cached is not None:
+        return cached
+    agent_name, agent = _select_agent(query, agents)
+    try:
+        run_context = AgentRunContext(dataframe, key[1])
+        result = Runner.run_sync(agent, query, context=run_context)
+        return _remember_answer(key, _collect_results(agent_name, query, result.final_output, run_context, dataframe))
+    except Exception as e:
+        return agent_name, f"Error: {str(e)}", None
+
+
+def route_query_stream(query: str, agents: Dict[str, Agent], dataframe: pd.DataFrame,
+                       outcome: dict) -> Iterator[str]:
+    """
+    Route query like route_query but yield the reply as it streams, for st.write_stream.
+    Tool calls are announced as they start. Once exhausted, outcome['result'] holds
+    the (agent_name, result_text, result_table) tuple route_query would have returned.
+    """
+    key = _answer_key(query, dataframe)
+    cached = st.session_state.get('agent_answers', {}).get(key)
+    if cached is not None:
+        outcome['result'] = cached
+        yield cached[1]
+        return
+    agent_name, agent = _select_agent(query, agents)
+    outcome['result'] = (agent_name, "Error: the agent run did not finish", None)
+    # The streamed run lives on its own event loop, stepped once per event
+    loop = asyncio.new_event_loop()
+    try:
+        run_context = AgentRunContext(dataframe, key[1])
         
-        # For statistical/correlation queries, try to get actual data
-        if (result_table is None or result_table.empty) and agent_name == 'statistical':
-            if 'correlation' in query_lower:
-                try:
-                    numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) >= 2:
-                        corr_df = statistical_tools.analyze_correlations(dataframe)
-                        if not corr_df.empty:
-                            result_table = corr_df
-                except:
-                    pass
-            elif 'statistic' in query_lower or 'summary' in query_lower:
-                try:
-                    stats_df = statistical_tools.calculate_statistics(dataframe)
-                    if not stats_df.empty:
-                        result_table = stats_df
-                except:
-                    pass
-            elif 'relationship' in query_lower or 'feature' in query_lower:
-                try:
-                    rel_df = statistical_tools.feature_relationships(dataframe)
-                    if not rel_df.empty:
-                        result_table = rel_df
-                except:
-                    pass
+        async def start():
+            return Runner.run_streamed(agent, query, context=run_context)
         
-        return agent_name, result_text, result_table
+        streamed = loop.run_until_complete(start())
+        events = streamed.stream_events()
+        while True:
+            try:
+                event = loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                break
+            if event.type == 'raw_response_event' and isinstance(event.data, ResponseTextDeltaEvent):
+                yield event.data.delta
+            elif event.type == 'run_item_stream_event' and event.name == 'tool_called':
+                yield f"\n\n*🔧 Running `{getattr(event.item.raw_item, 'name', 'tool')}`...*\n\n"
+        outcome['result'] = _remember_answer(
+            key, _collect_results(agent_name, query, streamed.final_output, run_context, dataframe))
     except Exception as e:
-        return agent_name, f"Error: {str(e)}", None
+        outcome['result'] = (agent_name, f"Error: {str(e)}", None)
+    finally:
+        loop.close()
+
+
+def run_queries_concurrent(queries: Dict[str, str], agents: Dict[str, Agent], dataframe: pd.DataFrame):
+    """
+    Run independent queries through route_query on a thread pool.
+    Yields (key, (agent_name, result_text, result_table)) in completion order and
+    records each result in st.session_state.quick_results.
+    """
+    # route_query reads session state, so the workers need this script run's context
+    ctx = get_script_run_ctx()
+    results = st.session_state.setdefault('quick_results', {})
+    with ThreadPoolExecutor(max_workers=min(8, len(queries)),
+                            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)) as executor:
+        futures = {executor.submit(route_query, query, agents, dataframe): key for key, query in queries.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            results[key] = future.result()
+            yield key, results[key]
+
+
+def render_agent_result(result: tuple, title: Optional[str] = None, height: Union[int, str] = "auto"):
+    """
+    Render a route_query result: its table when the agent produced one, otherwise
+    the raw reply. A title adds a subheader above either.
+    """
+    agent_name, result_text, result_table = result
+    if result_table is not None and not result_table.empty:
+        if title:
+            st.subheader(f"📋 {title}")
+        st.dataframe(result_table, use_container_width=True, height=height, column_config=_number_format(result_table))
+    else:
+        if title:
+            st.subheader(f"📝 {title}")
+        st.markdown(f"```\n{result_text}\n```")
+
+
+def _mark_picked(key: str):
+    # Keep the pick for this run and clear the control, so picking the same action
+    # again is a fresh selection rather than a deselect, and no highlight lingers
+    st.session_state[f"{key}_choice"] = st.session_state[key]
+    st.session_state[key] = None
+
+
+def _quick_action(options: List[str], key: str) -> Optional[str]:
+    """
+    Offer a panel of quick actions as one segmented control. Returns the option only
+    on the run in which it was picked, so each action fires once per pick like a button.
+    """
+    st.segmented_control("Quick action", options, key=key, label_visibility="collapsed",
+                         on_change=_mark_picked, args=(key,))
+    return st.session_state.pop(f"{key}_choice", None)
+
+
+def _show_streamed_query(query: str, agents: Dict[str, Agent], dataframe: pd.DataFrame) -> tuple:
+    """Show the agent's reply live while it streams, then hand back route_query's tuple."""
+    outcome = {}
+    live = st.empty()
+    with live.container():
+        st.write_stream(route_query_stream(query, agents, dataframe, outcome))
+    # The caller renders the final answer, so drop the live transcript
+    live.empty()
+    return outcome['result']
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _preview_table(_df: pd.DataFrame, fp: str, rows: int) -> pa.Table:
+    """
+    First rows as an Arrow table, which st.dataframe serializes as is. A resource
+    cache hands back the same immutable table, so repeat renders skip both the
+    pandas-to-Arrow conversion and the pickling st.cache_data would add.
+    """
+    return pa.Table.from_pandas(_df.head(rows), preserve_index=False)
+
+
+@st.fragment
+def _data_preview(dataframe: pd.DataFrame):
+    """Preview the first rows; moving the slider reruns only this fragment."""
+    st.markdown("### 👁️ Data Preview")
+    preview_rows = st.slider("Number of rows to preview", 5, 100, 10)
+    st.dataframe(_preview_table(dataframe, _session_fingerprint(dataframe), preview_rows),
+                 use_container_width=True, height=400)
+
+
+@st.fragment
+def _visualizations_panel(agents: Dict[str, Agent], dataframe: pd.DataFrame):
+    """
+    Chart request form and quick charts. Submitting either reruns only this fragment,
+    so drawing a chart does not re-execute the other tabs and summaries.
+    """
+    with st.form("viz_form", border=False):
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            viz_query = st.text_input(
+                "Request a visualization:",
+                placeholder="e.g., 'Create a scatter plot of age vs salary', 'Show histogram of age column', 'Create correlation heatmap'",
+                key="viz_query"
+            )
+        with col2:
+            run_viz = st.form_submit_button("📈 Create", type="primary", use_container_width=True)
+    
+    if run_viz:
+        query = viz_query if viz_query else "Create a correlation heatmap"
+        try:
+            agent_name, result_text, result_table = _show_streamed_query(
+                query,
+                agents,
+                dataframe
+            )
+            st.success(f"✅ Visualization created by {agent_name.replace('_', ' ').title()} Agent")
+            if result_text:
+                st.text(result_text)
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+    
+    # Quick visualization buttons
+    st.markdown("### ⚡ Quick Visualizations")
+    numeric_cols, categorical_cols = map(list, _session_column_groups(dataframe))
+    
+    # Only the charts the columns can support are offered
+    chart_queries = {"🔥 Heatmap": "Create a correlation heatmap"}
+    if len(numeric_cols) > 0:
+        chart_queries["📊 Histogram"] = f"Create a histogram of {numeric_cols[0]} column"
+        chart_queries["📊 Box Plot"] = f"Create a box plot of {numeric_cols[0]} column"
+    if len(numeric_cols) >= 2:
+        chart_queries["📈 Scatter Plot"] = f"Create a scatter plot of {numeric_cols[0]} vs {numeric_cols[1]}"
+        chart_queries["📉 Line Plot"] = f"Create a line plot of {numeric_cols[0]} vs {numeric_cols[1]}"
+    if len(numeric_cols) >= 3:
+        chart_queries["🔗 Pair Plot"] = f"Create a pair plot for {', '.join(numeric_cols[:3])}"
+    if len(categorical_cols) > 0:
+        chart_queries["📊 Bar Chart"] = f"Create a bar chart of {categorical_cols[0]} column"
+    action = _quick_action(list(chart_queries), key="quick_charts")
+    if action:
+        route_query(chart_queries[action], agents, dataframe)
+
+
+# Percentages in the quality summary are numeric; the % sign is added at display time
+_QUALITY_COLUMN_CONFIG = {
+    'Null Percentage': st.column_config.NumberColumn(format="%.2f%%"),
+    'Completeness': st.column_config.NumberColumn(format="%.2f%%"),
+}
+
+
+def _number_format(df: pd.DataFrame) -> dict:
+    """column_config showing float columns to 4 decimals without rounding the data."""
+    return {col: st.column_config.NumberColumn(format="%.4f") for col in df.select_dtypes(include=[np.floating]).columns}
+
+
+@st.fragment
+def _dataset_overview(dataframe: pd.DataFrame):
+    """Dataset metrics and quality summary, built from the per-fingerprint caches."""
+    st.markdown("### 📊 Dataset Overview")
+    numeric_cols, categorical_cols = _session_column_groups(dataframe)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric("📈 Rows", f"{dataframe.shape[0]:,}")
+    with col2:
+        st.metric("📋 Columns", dataframe.shape[1])
+    with col3:
+        st.metric("🔢 Numeric", len(numeric_cols))
+    with col4:
+        st.metric("📝 Categorical", len(categorical_cols))
+    with col5:
+        st.metric("💾 Memory", f"{_mem_mb(dataframe, _session_fingerprint(dataframe)):.2f} MB")
+    
+    # Data Quality Summary - ALWAYS SHOW FIRST
+    st.markdown("---")
+    st.markdown("### 🔍 Data Quality Summary")
+    with st.expander("📋 View Data Quality Details (Missing Values, Nulls, Duplicates)", expanded=True):
+        try:
+            quality_df = _quality(dataframe, _session_fingerprint(dataframe))
+            st.dataframe(quality_df, use_container_width=True, height=400, column_config=_QUALITY_COLUMN_CONFIG)
+                    
+            # Summary metrics
+            total_nulls = quality_df['Null Count'].sum()
+            total_duplicates = quality_df['Duplicates'].sum()
+            avg_completeness = quality_df['Completeness'].mean()
+                    
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("⚠️ Total Nulls", f"{total_nulls:,}")
+            with col2:
+                st.metric("🔄 Total Duplicates", f"{total_duplicates:,}")
+            with col3:
+                st.metric("✅ Avg Completeness", f"{avg_completeness:.1f}%")
+        except Exception as e:
+            st.warning(f"Could not generate quality summary: {e}")
 
 
 def main():
@@ -716,7 +1307,9 @@ def main():
             "Upload CSV or Excel files", 
             type=["csv", "xlsx"],
             accept_multiple_files=True,
-            help="Upload one or more data files to analyze"
+            help="Upload one or more data files to analyze",
+            key="uploaded_files",
+            on_change=_mark_upload_changed
         )
         
         st.markdown("---")
@@ -732,58 +1325,30 @@ def main():
         """)
     
     # Check if we have data (either from upload or session state)
-    if uploaded_files:
-        with st.spinner("Loading data..."):
-            combined_data = load_combined_data(uploaded_files)
-            st.session_state.dataframe = combined_data
-            st.session_state.data_loaded = True
-        
-        # Create agents if not already created or if data changed
-        if 'agents' not in st.session_state or not st.session_state.agents:
-            with st.spinner("Initializing specialized agents..."):
-                st.session_state.agents = create_agents(combined_data)
+    # Files are only hashed after the uploader reports a change, and only a new set of
+    # files is loaded; plain reruns keep the session dataframe
+    upload_changed = st.session_state.pop('upload_changed', False)
+    if uploaded_files and (upload_changed or 'upload_key' not in st.session_state):
+        files_key = _upload_key(uploaded_files)
+        if st.session_state.get('upload_key') != files_key:
+            with st.spinner("Loading data..."):
+                combined_data = load_combined_data(files_key, uploaded_files)
+                st.session_state.dataframe = combined_data
+                st.session_state.data_fingerprint = _fingerprint(combined_data)
+                st.session_state.pop('agent_answers', None)
+                _session_column_groups(combined_data)
+                st.session_state.upload_key = files_key
+                st.session_state.data_loaded = True
     
     # Use session state data if available - THIS ENSURES TABS ALWAYS SHOW WHEN DATA EXISTS
     if 'dataframe' in st.session_state and st.session_state.dataframe is not None and not st.session_state.dataframe.empty:
         combined_data = st.session_state.dataframe
+        # Agents are cached per schema and shared across reruns and sessions
+        agents = create_agents(combined_data)
         
         # Data Overview Section (always visible) - wrapped in try-except to ensure tabs are always created
         try:
-            st.markdown("### 📊 Dataset Overview")
-            col1, col2, col3, col4, col5 = st.columns(5)
-            with col1:
-                st.metric("📈 Rows", f"{combined_data.shape[0]:,}")
-            with col2:
-                st.metric("📋 Columns", combined_data.shape[1])
-            with col3:
-                st.metric("🔢 Numeric", len(combined_data.select_dtypes(include=[np.number]).columns))
-            with col4:
-                st.metric("📝 Categorical", len(combined_data.select_dtypes(include=['object', 'category']).columns))
-            with col5:
-                st.metric("💾 Memory", f"{combined_data.memory_usage(deep=True).sum() / (1024**2):.2f} MB")
-            
-            # Data Quality Summary - ALWAYS SHOW FIRST
-            st.markdown("---")
-            st.markdown("### 🔍 Data Quality Summary")
-            with st.expander("📋 View Data Quality Details (Missing Values, Nulls, Duplicates)", expanded=True):
-                try:
-                    quality_df = data_tools.get_data_quality_summary(combined_data)
-                    st.dataframe(quality_df, use_container_width=True, height=400)
-                    
-                    # Summary metrics
-                    total_nulls = quality_df['Null Count'].sum()
-                    total_duplicates = quality_df['Duplicates'].sum()
-                    avg_completeness = quality_df['Completeness'].str.rstrip('%').astype(float).mean()
-                    
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("⚠️ Total Nulls", f"{total_nulls:,}")
-                    with col2:
-                        st.metric("🔄 Total Duplicates", f"{total_duplicates:,}")
-                    with col3:
-                        st.metric("✅ Avg Completeness", f"{avg_completeness:.1f}%")
-                except Exception as e:
-                    st.warning(f"Could not generate quality summary: {e}")
+            _dataset_overview(combined_data)
         except Exception as e:
             st.warning(f"Error displaying data overview: {e}")
         
@@ -806,101 +1371,55 @@ def main():
                 st.header("📊 Statistical Analysis")
                 st.markdown("Get comprehensive statistical insights about your data")
                 
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    stat_query = st.text_input(
-                        "Ask about statistics:",
-                        placeholder="e.g., 'Calculate statistics for all numeric columns', 'Show mean and median for age column'",
-                        key="stat_query"
-                    )
-                with col2:
-                    run_stat = st.button("📊 Analyze", type="primary", use_container_width=True)
+                # The form only reruns the script on submit (button or Enter), so the
+                # agent is not re-queried on unrelated reruns
+                with st.form("stat_form", border=False):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        stat_query = st.text_input(
+                            "Ask about statistics:",
+                            placeholder="e.g., 'Calculate statistics for all numeric columns', 'Show mean and median for age column'",
+                            key="stat_query"
+                        )
+                    with col2:
+                        run_stat = st.form_submit_button("📊 Analyze", type="primary", use_container_width=True)
                 
-                if run_stat or stat_query:
+                if run_stat:
                     query = stat_query if stat_query else "Calculate comprehensive statistics for all numeric columns"
-                    with st.spinner("🤖 Statistical Agent is analyzing..."):
-                        try:
-                            agent_name, result_text, result_table = route_query(
-                                query,
-                                st.session_state.agents,
-                                combined_data
-                            )
-                            
-                            # Always show table if available
-                            if result_table is not None and not result_table.empty:
-                                st.subheader("📋 Statistical Results")
-                                # Format numeric columns
-                                formatted_table = result_table.copy()
-                                for col in formatted_table.select_dtypes(include=[np.number]).columns:
-                                    formatted_table[col] = formatted_table[col].round(4)
-                                st.dataframe(formatted_table, use_container_width=True, height=400)
-                            else:
-                                # Try to extract table from text
-                                extracted_table = extract_dataframe_from_result(result_text, combined_data, query)
-                                if extracted_table is not None and not extracted_table.empty:
-                                    st.subheader("📋 Statistical Results")
-                                    st.dataframe(extracted_table, use_container_width=True, height=400)
-                                else:
-                                    # Show text only if no table could be extracted
-                                    st.subheader("📝 Analysis Results")
-                                    st.markdown(f"```\n{result_text}\n```")
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
+                    try:
+                        render_agent_result(_show_streamed_query(query, agents, combined_data), "Statistical Results", height=400)
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
             except Exception as e:
                 st.error(f"Error in Statistics tab: {str(e)}")
                 st.info("Please try refreshing the page or re-uploading your data.")
             
             # Quick stats buttons
             st.markdown("### ⚡ Quick Statistics")
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                if st.button("📊 Summary Stats", use_container_width=True):
-                    agent_name, result_text, result_table = route_query(
-                        "Calculate comprehensive statistics for all numeric columns",
-                        st.session_state.agents,
-                        combined_data
-                    )
-                    if result_table is not None and not result_table.empty:
-                        st.dataframe(result_table, use_container_width=True)
-                    else:
-                        extracted = extract_dataframe_from_result(result_text, combined_data)
-                        if extracted is not None and not extracted.empty:
-                            st.dataframe(extracted, use_container_width=True)
-            with col2:
-                if st.button("📈 Distribution", use_container_width=True):
-                    numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) > 0:
-                        agent_name, result_text, result_table = route_query(
-                            f"Analyze the distribution of {numeric_cols[0]} column",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                        if result_table is not None and not result_table.empty:
-                            st.dataframe(result_table, use_container_width=True)
-                        else:
-                            extracted = extract_dataframe_from_result(result_text, combined_data)
-                            if extracted is not None and not extracted.empty:
-                                st.dataframe(extracted, use_container_width=True)
-            with col3:
-                if st.button("🧪 Hypothesis Test", use_container_width=True):
-                    numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) > 0:
-                        agent_name, result_text, result_table = route_query(
-                            f"Perform hypothesis test on {numeric_cols[0]} column",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                        if result_table is not None and not result_table.empty:
-                            st.dataframe(result_table, use_container_width=True)
-                        else:
-                            extracted = extract_dataframe_from_result(result_text, combined_data)
-                            if extracted is not None and not extracted.empty:
-                                st.dataframe(extracted, use_container_width=True)
-            with col4:
-                if st.button("📉 Percentiles", use_container_width=True):
-                    numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                    if len(numeric_cols) > 0:
-                        st.dataframe(combined_data[numeric_cols].describe().T, use_container_width=True)
+            action = _quick_action(["📊 Summary Stats", "📈 Distribution", "🧪 Hypothesis Test", "📉 Percentiles"], key="quick_stats")
+            numeric_cols, _ = _session_column_groups(combined_data)
+            if action and len(numeric_cols) > 0:
+                if action in ("📊 Summary Stats", "📉 Percentiles"):
+                    # A deterministic pandas summary; no agent round-trip needed
+                    st.dataframe(_describe(combined_data, _session_fingerprint(combined_data), numeric_cols), use_container_width=True)
+                elif action == "📈 Distribution":
+                    render_agent_result(route_query(f"Analyze the distribution of {numeric_cols[0]} column", agents, combined_data))
+                elif action == "🧪 Hypothesis Test":
+                    render_agent_result(route_query(f"Perform hypothesis test on {numeric_cols[0]} column", agents, combined_data))
+            
+            # Run the agent-backed quick statistics side by side; each result is shown as it arrives
+            quick_queries = {}
+            if len(numeric_cols) > 0:
+                quick_queries["📈 Distribution"] = f"Analyze the distribution of {numeric_cols[0]} column"
+                quick_queries["🧪 Hypothesis Test"] = f"Perform hypothesis test on {numeric_cols[0]} column"
+            if quick_queries and st.button("⚡ Run All Quick Statistics", use_container_width=True):
+                st.session_state.quick_results = {}
+                quick_results = run_queries_concurrent(quick_queries, agents, combined_data)
+            else:
+                quick_results = st.session_state.get('quick_results', {}).items()
+            for key, result in quick_results:
+                st.markdown(f"**{key}**")
+                render_agent_result(result)
         
         # Tab 2: Data Analysis
         with tab2:
@@ -910,96 +1429,50 @@ def main():
                 
                 st.markdown("**💡 Supported Operations:** ORDER BY, GROUP BY, WHERE conditions, LIMIT, multiple filters with AND/OR logic")
                 
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    analysis_query = st.text_input(
-                        "Ask about your data (supports SQL-like queries):",
-                        placeholder="e.g., 'Order by salary desc limit 10', 'Group by department calculate average salary', 'Filter where age > 30 and salary > 50000'",
-                        key="analysis_query"
-                    )
-                with col2:
-                    run_analysis = st.button("🔍 Analyze", type="primary", use_container_width=True)
+                with st.form("analysis_form", border=False):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        analysis_query = st.text_input(
+                            "Ask about your data (supports SQL-like queries):",
+                            placeholder="e.g., 'Order by salary desc limit 10', 'Group by department calculate average salary', 'Filter where age > 30 and salary > 50000'",
+                            key="analysis_query"
+                        )
+                    with col2:
+                        run_analysis = st.form_submit_button("🔍 Analyze", type="primary", use_container_width=True)
                 
-                if run_analysis or analysis_query:
+                if run_analysis:
                     query = analysis_query if analysis_query else "Get comprehensive information about the dataset"
-                    with st.spinner("🤖 Analysis Agent is processing..."):
-                        try:
-                            agent_name, result_text, result_table = route_query(
-                                query,
-                                st.session_state.agents,
-                                combined_data
-                            )
-                            
-                            # Always prioritize showing table format
-                            if result_table is not None and not result_table.empty:
-                                st.subheader("📋 Analysis Results")
-                                st.dataframe(result_table, use_container_width=True, height=400)
-                            else:
-                                # Try to extract table from text
-                                extracted_table = extract_dataframe_from_result(result_text, combined_data, query)
-                                if extracted_table is not None and not extracted_table.empty:
-                                    st.subheader("📋 Analysis Results")
-                                    st.dataframe(extracted_table, use_container_width=True, height=400)
-                                else:
-                                    # Only show text if no table could be extracted
-                                    st.subheader("📝 Analysis Results")
-                                    st.markdown(f"```\n{result_text}\n```")
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
-                            st.info("Try rephrasing your query or use simpler syntax like 'order by column_name' or 'group by column_name'")
+                    try:
+                        render_agent_result(_show_streamed_query(query, agents, combined_data), "Analysis Results", height=400)
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
+                        st.info("Try rephrasing your query or use simpler syntax like 'order by column_name' or 'group by column_name'")
                 
                 # Data preview
-                st.markdown("### 👁️ Data Preview")
-                preview_rows = st.slider("Number of rows to preview", 5, 100, 10)
-                st.dataframe(combined_data.head(preview_rows), use_container_width=True, height=400)
+                _data_preview(combined_data)
                 
                 # Quick analysis buttons
                 st.markdown("### ⚡ Quick Actions")
-                col1, col2, col3, col4, col5 = st.columns(5)
-                with col1:
-                    if st.button("📋 Data Info", use_container_width=True):
-                        agent_name, result_text, result_table = route_query(
-                            "Get comprehensive information about the dataset",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                        if result_table is not None and not result_table.empty:
-                            st.dataframe(result_table, use_container_width=True)
-                        else:
-                            extracted = extract_dataframe_from_result(result_text, combined_data)
-                            if extracted is not None and not extracted.empty:
-                                st.dataframe(extracted, use_container_width=True)
-                with col2:
-                    if st.button("🔍 Data Quality", use_container_width=True):
-                        try:
-                            quality_df = data_tools.get_data_quality_summary(combined_data)
-                            st.dataframe(quality_df, use_container_width=True)
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-                with col3:
-                    if st.button("🔍 Detect Outliers", use_container_width=True):
-                        numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                        if len(numeric_cols) > 0:
-                            agent_name, result_text, result_table = route_query(
-                                f"Detect outliers in {numeric_cols[0]} column",
-                                st.session_state.agents,
-                                combined_data
-                            )
-                            if result_table is not None and not result_table.empty:
-                                st.dataframe(result_table, use_container_width=True)
-                            else:
-                                extracted = extract_dataframe_from_result(result_text, combined_data)
-                                if extracted is not None and not extracted.empty:
-                                    st.dataframe(extracted, use_container_width=True)
-                with col4:
-                    if st.button("📊 Column Info", use_container_width=True):
-                        st.dataframe(combined_data.dtypes.to_frame('Data Type'), use_container_width=True)
-                with col5:
-                    if st.button("🔢 Missing Values", use_container_width=True):
-                        missing = combined_data.isnull().sum()
-                        missing_df = missing[missing > 0].to_frame('Missing Count')
-                        missing_df['Percentage'] = (missing_df['Missing Count'] / len(combined_data) * 100).round(2)
-                        st.dataframe(missing_df, use_container_width=True)
+                action = _quick_action(["📋 Data Info", "🔍 Data Quality", "🔍 Detect Outliers", "📊 Column Info", "🔢 Missing Values"], key="quick_actions")
+                if action == "📋 Data Info":
+                    st.dataframe(_info(combined_data, _session_fingerprint(combined_data)), use_container_width=True)
+                elif action == "🔍 Data Quality":
+                    try:
+                        quality_df = _quality(combined_data, _session_fingerprint(combined_data))
+                        st.dataframe(quality_df, use_container_width=True, column_config=_QUALITY_COLUMN_CONFIG)
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+                elif action == "🔍 Detect Outliers":
+                    numeric_cols, _ = _session_column_groups(combined_data)
+                    if len(numeric_cols) > 0:
+                        column = numeric_cols[0]
+                        outliers = _outliers(combined_data, _session_fingerprint(combined_data), column)
+                        st.caption(f"{len(outliers):,} outliers in {column} (IQR method)")
+                        st.dataframe(outliers, use_container_width=True)
+                elif action == "📊 Column Info":
+                    st.dataframe(combined_data.dtypes.to_frame('Data Type'), use_container_width=True)
+                elif action == "🔢 Missing Values":
+                    st.dataframe(_nulls(combined_data, _session_fingerprint(combined_data)), use_container_width=True)
             except Exception as e:
                 st.error(f"Error in Data Analysis tab: {str(e)}")
                 st.info("Please try refreshing the page or re-uploading your data.")
@@ -1010,90 +1483,7 @@ def main():
                 st.header("📈 Data Visualizations")
                 st.markdown("Create beautiful charts and graphs from your data")
                 
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    viz_query = st.text_input(
-                        "Request a visualization:",
-                        placeholder="e.g., 'Create a scatter plot of age vs salary', 'Show histogram of age column', 'Create correlation heatmap'",
-                        key="viz_query"
-                    )
-                with col2:
-                    run_viz = st.button("📈 Create", type="primary", use_container_width=True)
-                
-                if run_viz or viz_query:
-                    query = viz_query if viz_query else "Create a correlation heatmap"
-                    with st.spinner("🤖 Visualization Agent is creating your chart..."):
-                        try:
-                            agent_name, result_text, result_table = route_query(
-                                query,
-                                st.session_state.agents,
-                                combined_data
-                            )
-                            st.success(f"✅ Visualization created by {agent_name.replace('_', ' ').title()} Agent")
-                            if result_text:
-                                st.text(result_text)
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
-                
-                # Quick visualization buttons
-                st.markdown("### ⚡ Quick Visualizations")
-                numeric_cols = list(combined_data.select_dtypes(include=[np.number]).columns)
-                categorical_cols = list(combined_data.select_dtypes(include=['object', 'category']).columns)
-                
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    if st.button("📊 Histogram", use_container_width=True) and len(numeric_cols) > 0:
-                        route_query(
-                            f"Create a histogram of {numeric_cols[0]} column",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                with col2:
-                    if st.button("📈 Scatter Plot", use_container_width=True) and len(numeric_cols) >= 2:
-                        route_query(
-                            f"Create a scatter plot of {numeric_cols[0]} vs {numeric_cols[1]}",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                with col3:
-                    if st.button("🔥 Heatmap", use_container_width=True):
-                        route_query(
-                            "Create a correlation heatmap",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                with col4:
-                    if st.button("📊 Box Plot", use_container_width=True) and len(numeric_cols) > 0:
-                        route_query(
-                            f"Create a box plot of {numeric_cols[0]} column",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                
-                if len(numeric_cols) >= 2:
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("📉 Line Plot", use_container_width=True):
-                            route_query(
-                                f"Create a line plot of {numeric_cols[0]} vs {numeric_cols[1]}",
-                                st.session_state.agents,
-                                combined_data
-                            )
-                    with col2:
-                        if st.button("🔗 Pair Plot", use_container_width=True) and len(numeric_cols) >= 3:
-                            route_query(
-                                f"Create a pair plot for {', '.join(numeric_cols[:3])}",
-                                st.session_state.agents,
-                                combined_data
-                            )
-                
-                if len(categorical_cols) > 0:
-                    if st.button("📊 Bar Chart", use_container_width=True):
-                        route_query(
-                            f"Create a bar chart of {categorical_cols[0]} column",
-                            st.session_state.agents,
-                            combined_data
-                        )
+                _visualizations_panel(agents, combined_data)
             except Exception as e:
                 st.error(f"Error in Visualizations tab: {str(e)}")
                 st.info("Please try refreshing the page or re-uploading your data.")
@@ -1104,134 +1494,62 @@ def main():
                 st.header("🔗 Feature Relationships & Correlations")
                 st.markdown("Discover relationships and dependencies between features")
                 
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    rel_query = st.text_input(
-                        "Analyze relationships:",
-                        placeholder="e.g., 'Show correlations between all features', 'Analyze feature relationships', 'Show feature importance for target column'",
-                        key="rel_query"
-                    )
-                with col2:
-                    run_rel = st.button("🔗 Analyze", type="primary", use_container_width=True)
+                with st.form("rel_form", border=False):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        rel_query = st.text_input(
+                            "Analyze relationships:",
+                            placeholder="e.g., 'Show correlations between all features', 'Analyze feature relationships', 'Show feature importance for target column'",
+                            key="rel_query"
+                        )
+                    with col2:
+                        run_rel = st.form_submit_button("🔗 Analyze", type="primary", use_container_width=True)
                 
-                if run_rel or rel_query:
+                if run_rel:
                     query = rel_query if rel_query else "Analyze correlations between all numeric features and format as table"
-                    with st.spinner("🤖 Statistical Agent is analyzing relationships..."):
-                        try:
-                            agent_name, result_text, result_table = route_query(
-                                query,
-                                st.session_state.agents,
-                                combined_data
-                            )
-                            
-                            # Always show table format for relationships
-                            if result_table is not None and not result_table.empty:
-                                st.subheader("📋 Feature Relationships")
-                                # Format numeric columns to 4 decimal places
-                                formatted_table = result_table.copy()
-                                for col in formatted_table.select_dtypes(include=[np.number]).columns:
-                                    formatted_table[col] = formatted_table[col].round(4)
-                                st.dataframe(formatted_table, use_container_width=True, height=400)
-                            else:
-                                # Try to extract table from text
-                                extracted_table = extract_dataframe_from_result(result_text, combined_data, query)
-                                if extracted_table is not None and not extracted_table.empty:
-                                    st.subheader("📋 Feature Relationships")
-                                    # Format numeric columns to 4 decimal places
-                                    formatted_table = extracted_table.copy()
-                                    for col in formatted_table.select_dtypes(include=[np.number]).columns:
-                                        formatted_table[col] = formatted_table[col].round(4)
-                                    st.dataframe(formatted_table, use_container_width=True, height=400)
-                                else:
-                                    # For correlation queries, try to get correlation matrix directly
-                                    if 'correlation' in query.lower():
-                                        try:
-                                            numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                                            if len(numeric_cols) >= 2:
-                                                corr_df = statistical_tools.analyze_correlations(combined_data)
-                                                if not corr_df.empty:
-                                                    st.subheader("📋 Correlation Matrix")
-                                                    formatted_corr = corr_df.round(4)
-                                                    st.dataframe(formatted_corr, use_container_width=True, height=400)
-                                                else:
-                                                    st.markdown(f"```\n{result_text}\n```")
-                                            else:
-                                                st.markdown(f"```\n{result_text}\n```")
-                                        except:
-                                            st.markdown(f"```\n{result_text}\n```")
-                                    else:
-                                        st.markdown(f"```\n{result_text}\n```")
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
+                    try:
+                        agent_name, result_text, result_table = _show_streamed_query(query, agents, combined_data)
+                        # For correlation queries without a table, show the correlation matrix directly
+                        if (result_table is None or result_table.empty) and 'correlation' in query.lower():
+                            numeric_cols, _ = _session_column_groups(combined_data)
+                            if len(numeric_cols) >= 2:
+                                result_table = _corr(combined_data, _session_fingerprint(combined_data))
+                        render_agent_result((agent_name, result_text, result_table), "Feature Relationships", height=400)
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
                 
                 # Quick relationship buttons
                 st.markdown("### ⚡ Quick Relationship Analysis")
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    if st.button("🔗 Correlations", use_container_width=True):
-                        # Directly get correlation matrix
-                        try:
-                            numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                            if len(numeric_cols) >= 2:
-                                corr_df = statistical_tools.analyze_correlations(combined_data)
-                                if not corr_df.empty:
-                                    formatted_corr = corr_df.round(4)
-                                    st.dataframe(formatted_corr, use_container_width=True)
-                                else:
-                                    agent_name, result_text, result_table = route_query(
-                                        "Analyze correlations between all numeric features and format as table",
-                                        st.session_state.agents,
-                                        combined_data
-                                    )
-                                    if result_table is not None and not result_table.empty:
-                                        formatted_table = result_table.round(4)
-                                        st.dataframe(formatted_table, use_container_width=True)
-                            else:
-                                st.warning("Need at least 2 numeric columns for correlation analysis")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-                with col2:
-                    if st.button("📊 Feature Relationships", use_container_width=True):
-                        try:
-                            rel_df = statistical_tools.feature_relationships(combined_data)
-                            if not rel_df.empty:
-                                formatted_rel = rel_df.round(4)
-                                st.dataframe(formatted_rel, use_container_width=True)
-                            else:
-                                agent_name, result_text, result_table = route_query(
-                                    "Analyze relationships between all feature pairs",
-                                    st.session_state.agents,
-                                    combined_data
-                                )
-                                if result_table is not None and not result_table.empty:
-                                    formatted_table = result_table.round(4)
-                                    st.dataframe(formatted_table, use_container_width=True)
-                        except Exception as e:
-                            st.error(f"Error: {e}")
-                with col3:
-                    if st.button("🔥 Correlation Heatmap", use_container_width=True):
-                        route_query(
-                            "Create a correlation heatmap",
-                            st.session_state.agents,
-                            combined_data
-                        )
-                with col4:
-                    if st.button("⭐ Feature Importance", use_container_width=True):
-                        numeric_cols = combined_data.select_dtypes(include=[np.number]).columns
-                        if len(numeric_cols) > 1:
-                            agent_name, result_text, result_table = route_query(
-                                f"Calculate feature importance for {numeric_cols[-1]} column",
-                                st.session_state.agents,
-                                combined_data
-                            )
-                            if result_table is not None and not result_table.empty:
-                                formatted_table = result_table.round(4)
-                                st.dataframe(formatted_table, use_container_width=True)
+                action = _quick_action(["🔗 Correlations", "📊 Feature Relationships", "🔥 Correlation Heatmap", "⭐ Feature Importance"], key="quick_relationships")
+                if action == "🔗 Correlations":
+                    # Directly get correlation matrix
+                    try:
+                        numeric_cols, _ = _session_column_groups(combined_data)
+                        if len(numeric_cols) >= 2:
+                            corr_df = _corr(combined_data, _session_fingerprint(combined_data))
+                            if not corr_df.empty:
+                                st.dataframe(corr_df, use_container_width=True, column_config=_number_format(corr_df))
                             else:
-                                extracted = extract_dataframe_from_result(result_text, combined_data)
-                                if extracted is not None and not extracted.empty:
-                                    formatted_extracted = extracted.round(4)
-                                    st.dataframe(formatted_extracted, use_container_width=True)
+                                render_agent_result(route_query("Analyze correlations between all numeric features and format as table", agents, combined_data))
+                        else:
+                            st.warning("Need at least 2 numeric columns for correlation analysis")
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+                elif action == "📊 Feature Relationships":
+                    try:
+                        rel_df = _rel(combined_data, _session_fingerprint(combined_data))
+                        if not rel_df.empty:
+                            st.dataframe(rel_df, use_container_width=True, column_config=_number_format(rel_df))
+                        else:
+                            render_agent_result(route_query("Analyze relationships between all feature pairs", agents, combined_data))
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+                elif action == "🔥 Correlation Heatmap":
+                    route_query("Create a correlation heatmap", agents, combined_data)
+                elif action == "⭐ Feature Importance":
+                    numeric_cols, _ = _session_column_groups(combined_data)
+                    if len(numeric_cols) > 1:
+                        render_agent_result(route_query(f"Calculate feature importance for {numeric_cols[-1]} column", agents, combined_data))
             except Exception as e:
                 st.error(f"Error in Feature Relationships tab: {str(e)}")
                 st.info("Please try refreshing the page or re-uploading your data.")
@@ -1254,37 +1572,36 @@ def main():
                     run_chat = st.button("🚀 Ask", type="primary", use_container_width=True)
                 
                 if run_chat and query:
-                    with st.spinner("🤖 AI Agents are thinking..."):
-                        try:
-                            agent_name, result_text, result_table = route_query(
-                                query,
-                                st.session_state.agents,
-                                combined_data
-                            )
+                    try:
+                        agent_name, result_text, result_table = _show_streamed_query(
+                            query,
+                            agents,
+                            combined_data
+                        )
                             
-                            st.success(f"✅ Answered by: **{agent_name.replace('_', ' ').title()} Agent**")
+                        st.success(f"✅ Answered by: **{agent_name.replace('_', ' ').title()} Agent**")
                             
-                            # Always prioritize showing table format
-                            if result_table is not None and not result_table.empty:
+                        # Always prioritize showing table format
+                        if result_table is not None and not result_table.empty:
+                            st.subheader("📋 Results")
+                            st.dataframe(result_table, use_container_width=True, height=400)
+                        else:
+                            # Try to extract table from text
+                            extracted_table = extract_dataframe_from_result(result_text, combined_data, query)
+                            if extracted_table is not None and not extracted_table.empty:
                                 st.subheader("📋 Results")
-                                st.dataframe(result_table, use_container_width=True, height=400)
-                            else:
-                                # Try to extract table from text
-                                extracted_table = extract_dataframe_from_result(result_text, combined_data, query)
-                                if extracted_table is not None and not extracted_table.empty:
-                                    st.subheader("📋 Results")
-                                    st.dataframe(extracted_table, use_container_width=True, height=400)
+                                st.dataframe(extracted_table, use_container_width=True, height=400)
                             
-                            # Show text answer only if it contains additional insights beyond the table
-                            if result_text and (result_table is None or result_table.empty):
-                                st.subheader("📝 Answer")
-                                st.markdown(result_text)
-                            elif result_text and len(result_text) > 200:  # Show if there's substantial text content
-                                st.subheader("📝 Additional Insights")
-                                st.markdown(result_text)
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
-                            st.info("Make sure your OPENAI_API_KEY is valid and you have API credits.")
+                        # Show text answer only if it contains additional insights beyond the table
+                        if result_text and (result_table is None or result_table.empty):
+                            st.subheader("📝 Answer")
+                            st.markdown(result_text)
+                        elif result_text and len(result_text) > 200:  # Show if there's substantial text content
+                            st.subheader("📝 Additional Insights")
+                            st.markdown(result_text)
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
+                        st.info("Make sure your OPENAI_API_KEY is valid and you have API credits.")
                 
                 # Example queries
                 st.markdown("### 💡 Example Questions")
@@ -1297,23 +1614,22 @@ def main():
                 ]
                 for example in examples:
                     if st.button(f"💡 {example}", key=f"example_{example}", use_container_width=True):
-                        with st.spinner("🤖 Processing..."):
-                            try:
-                                agent_name, result_text, result_table = route_query(
-                                    example,
-                                    st.session_state.agents,
-                                    combined_data
-                                )
-                                if result_table is not None and not result_table.empty:
-                                    st.dataframe(result_table, use_container_width=True)
+                        try:
+                            agent_name, result_text, result_table = _show_streamed_query(
+                                example,
+                                agents,
+                                combined_data
+                            )
+                            if result_table is not None and not result_table.empty:
+                                st.dataframe(result_table, use_container_width=True)
+                            else:
+                                extracted = extract_dataframe_from_result(result_text, combined_data, example)
+                                if extracted is not None and not extracted.empty:
+                                    st.dataframe(extracted, use_container_width=True)
                                 else:
-                                    extracted = extract_dataframe_from_result(result_text, combined_data, example)
-                                    if extracted is not None and not extracted.empty:
-                                        st.dataframe(extracted, use_container_width=True)
-                                    else:
-                                        st.markdown(result_text)
-                            except Exception as e:
-                                st.error(f"Error: {str(e)}")
+                                    st.markdown(result_text)
+                        except Exception as e:
+                            st.error(f"Error: {str(e)}")
             except Exception as e:
                 st.error(f"Error in AI Chat tab: {str(e)}")
                 st.info("Please try refreshing the page or re-uploading your data.")
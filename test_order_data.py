@@ -5,9 +5,12 @@ Tests all functionalities of the Multi-Agent Data Analysis System
 import pandas as pd
 import sys
 import os
+import importlib.util
+import logging
+from concurrent.futures import ThreadPoolExecutor
 sys.path.insert(0, '.')
 
-from tools import data_tools, statistical_tools, formatting_tools
+from tools import data_tools, advanced_data_tools, statistical_tools, formatting_tools
 
 # Load test data
 test_file = os.path.expanduser('~/Downloads/mock_order_data_analysis.csv')
@@ -15,7 +18,13 @@ if not os.path.exists(test_file):
     print(f"❌ Test file not found: {test_file}")
     sys.exit(1)
 
-df = pd.read_csv(test_file)
+# Known low-cardinality labels load as categoricals, so grouping hashes small codes
+dtypes = {'OrderStatus': 'category', 'Region': 'category'}
+try:
+    # Multithreaded Arrow parser, as the app uses for CSV uploads
+    df = pd.read_csv(test_file, engine='pyarrow', dtype=dtypes)
+except ImportError:
+    df = pd.read_csv(test_file, dtype=dtypes, low_memory=False)
 print("=" * 70)
 print("🧪 COMPREHENSIVE TEST SUITE FOR mock_order_data_analysis.csv")
 print("=" * 70)
@@ -23,66 +32,151 @@ print("=" * 70)
 test_results = {'passed': 0, 'failed': 0}
 
 def test(name, func, *args, **kwargs):
-    """Run a test and track results"""
+    """Run a test and return (name, passed, result or error)"""
     try:
-        result = func(*args, **kwargs)
-        print(f"✅ PASS: {name}")
-        test_results['passed'] += 1
-        return True, result
+        return name, True, func(*args, **kwargs)
     except Exception as e:
-        print(f"❌ FAIL: {name}")
-        print(f"   Error: {str(e)}")
-        test_results['failed'] += 1
-        return False, None
+        return name, False, e
 
-print("\n📊 TEST 1: Data Quality Summary")
-print("-" * 70)
-test("Data Quality Summary", data_tools.get_data_quality_summary, df)
-
-print("\n🔍 TEST 2: SQL-Like Operations")
-print("-" * 70)
-
-# ORDER BY tests
-test("ORDER BY desc", data_tools.execute_complex_query, df, "order by TotalAmount desc")
-test("ORDER BY asc", data_tools.execute_complex_query, df, "order by TotalAmount asc")
-test("ORDER BY with LIMIT", data_tools.execute_complex_query, df, "order by TotalAmount desc limit 10")
-
-# WHERE tests
-test("WHERE > condition", data_tools.execute_complex_query, df, "where TotalAmount > 1000")
-test("WHERE < condition", data_tools.execute_complex_query, df, "where Quantity < 5")
-
-# GROUP BY tests
-test("GROUP BY", data_tools.execute_complex_query, df, "group by OrderStatus")
-
-# Complex queries
-test("ORDER BY + LIMIT", data_tools.execute_complex_query, df, "order by TotalAmount desc limit 5")
-test("WHERE + ORDER BY", data_tools.execute_complex_query, df, "where TotalAmount > 1000 order by TotalAmount desc")
-
-print("\n🔗 TEST 3: Multi-Condition Filtering")
-print("-" * 70)
 conditions = [
     {'column': 'TotalAmount', 'operator': '>', 'value': 1000},
     {'column': 'Quantity', 'operator': '>', 'value': 5}
 ]
-test("Multi-filter AND", data_tools.multi_condition_filter, df, conditions, 'AND')
-test("Multi-filter OR", data_tools.multi_condition_filter, df, conditions, 'OR')
-
-print("\n📊 TEST 4: Advanced Grouping")
-print("-" * 70)
 agg_dict = {'TotalAmount': 'mean', 'Quantity': 'sum'}
-test("Advanced GROUP BY", data_tools.advanced_group_by, df, 'OrderStatus', agg_dict)
-
-print("\n📈 TEST 5: Statistical Analysis")
-print("-" * 70)
-test("Calculate Statistics", statistical_tools.calculate_statistics, df)
-test("Analyze Correlations", statistical_tools.analyze_correlations, df)
-test("Feature Relationships", statistical_tools.feature_relationships, df)
-test("Distribution Analysis", statistical_tools.distribution_analysis, df, 'TotalAmount')
-test("Feature Importance", statistical_tools.feature_importance, df, 'TotalAmount')
-
-print("\n📋 TEST 6: Data Info")
-print("-" * 70)
-test("Get Data Info", data_tools.get_data_info, df)
+
+# The query parsers match lower-cased column names
+queried = df.rename(columns=str.lower)
+
+def check_filtered_group_by(query_tool):
+    """GROUP BY after a WHERE counts only the categories with rows left, as groupby does"""
+    result = query_tool(queried, "where orderid < 3 group by region")
+    expected = queried[queried['orderid'] < 3].groupby('region', observed=True).size().reset_index(name='count')
+    assert result.equals(expected), f"got {result.to_dict('list')}"
+    return result
+
+def check_text_range_filter(filter_tool):
+    """Range comparisons on a text column, as the app loads it, select the rows pandas does"""
+    text = df.astype({'Region': 'str'})
+    result = filter_tool(text, [{'column': 'Region', 'operator': '>', 'value': 'M'}])
+    assert result.equals(text[text['Region'] > 'M']), f"got {len(result)} rows"
+    return result
+
+def check_category_sum_overflow():
+    """Grouped sums of int64 values too large for float64 match groupby's exact sums"""
+    frame = pd.DataFrame({'key': pd.Categorical(['a', 'a', 'b', 'b']),
+                          'value': pd.Series([2**62 + 1, 2**62 + 1, 2**62 + 1, -2**62], dtype='int64')})
+    result = data_tools.group_by_aggregate(frame, 'key', 'sum', 'value')
+    expected = frame.groupby('key', observed=True)['value'].sum().reset_index()
+    assert result.equals(expected), f"got {result.to_dict('list')}"
+    return result
+
+def check_queries_do_not_copy():
+    """The query executors hand back the input itself when no clause applies, and leave it unmodified"""
+    snapshot = df.copy()
+    for query_tool in (data_tools.execute_complex_query, advanced_data_tools.complex_query):
+        assert query_tool(df, "show all rows") is df, f"{query_tool.__name__} copied its input"
+        for query in ("where TotalAmount > 1000 order by TotalAmount desc limit 5", "group by Region"):
+            query_tool(df, query)
+    data_tools.advanced_group_by(df, 'OrderStatus', agg_dict)
+    data_tools.multi_condition_filter(df, conditions, 'AND')
+    assert df.equals(snapshot), "an executor modified its input"
+
+# Query routing lives in the app module, whose file name is not importable by name.
+# Loading it outside `streamlit run` only logs bare-mode warnings, silenced here
+spec = importlib.util.spec_from_file_location(
+    'data_insights', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data-insights.py'))
+app = importlib.util.module_from_spec(spec)
+logging.disable(logging.WARNING)
+spec.loader.exec_module(app)
+logging.disable(logging.NOTSET)
+
+# Query -> agent that should answer it, including inflected keywords
+routes = {
+    "plotting revenue by region": 'visualization',
+    "visualise sales over time": 'visualization',
+    "filtering rows with qty > 5": 'analysis',
+    "sorted by price": 'analysis',
+    "are price and quantity correlated": 'statistical',
+    "how is the price distributed": 'statistical',
+    "test these hypotheses": 'statistical',
+    "formatted summary of totals": 'formatting',
+    "Data Info": 'analysis',
+}
+
+def check_routing():
+    """Every query in the routing table reaches its agent"""
+    agents = {name: name for name in set(routes.values())}
+    picked = {query: app._select_agent(query, agents)[0] for query in routes}
+    wrong = {query: name for query, name in picked.items() if name != routes[query]}
+    assert not wrong, f"misrouted {wrong}"
+    return picked
+
+# (section header, [(name, func, *args), ...]); every test only reads df
+suites = [
+    ("📊 TEST 1: Data Quality Summary", [
+        ("Data Quality Summary", data_tools.get_data_quality_summary, df),
+    ]),
+    ("🔍 TEST 2: SQL-Like Operations", [
+        # ORDER BY tests
+        ("ORDER BY desc", data_tools.execute_complex_query, df, "order by TotalAmount desc"),
+        ("ORDER BY asc", data_tools.execute_complex_query, df, "order by TotalAmount asc"),
+        ("ORDER BY with LIMIT", data_tools.execute_complex_query, df, "order by TotalAmount desc limit 10"),
+        # WHERE tests
+        ("WHERE > condition", data_tools.execute_complex_query, df, "where TotalAmount > 1000"),
+        ("WHERE < condition", data_tools.execute_complex_query, df, "where Quantity < 5"),
+        # GROUP BY tests
+        ("GROUP BY", data_tools.execute_complex_query, df, "group by OrderStatus"),
+        # Complex queries
+        ("ORDER BY + LIMIT", data_tools.execute_complex_query, df, "order by TotalAmount desc limit 5"),
+        ("WHERE + ORDER BY", data_tools.execute_complex_query, df, "where TotalAmount > 1000 order by TotalAmount desc"),
+        # Categorical keys with no rows left after the WHERE
+        ("WHERE + GROUP BY category", check_filtered_group_by, data_tools.execute_complex_query),
+        ("WHERE + GROUP BY category (complex_query)", check_filtered_group_by, advanced_data_tools.complex_query),
+        # The input frame is neither copied nor modified
+        ("Queries reuse their input", check_queries_do_not_copy),
+    ]),
+    ("🔗 TEST 3: Multi-Condition Filtering", [
+        ("Multi-filter AND", data_tools.multi_condition_filter, df, conditions, 'AND'),
+        ("Multi-filter OR", data_tools.multi_condition_filter, df, conditions, 'OR'),
+        ("Text range filter", check_text_range_filter, data_tools.multi_condition_filter),
+        ("Text range filter (advanced)", check_text_range_filter, advanced_data_tools.multi_condition_filter),
+    ]),
+    ("📊 TEST 4: Advanced Grouping", [
+        ("Advanced GROUP BY", data_tools.advanced_group_by, df, 'OrderStatus', agg_dict),
+        ("Categorical GROUP BY sum near int64 range", check_category_sum_overflow),
+    ]),
+    ("📈 TEST 5: Statistical Analysis", [
+        ("Calculate Statistics", statistical_tools.calculate_statistics, df),
+        ("Analyze Correlations", statistical_tools.analyze_correlations, df),
+        ("Feature Relationships", statistical_tools.feature_relationships, df),
+        ("Distribution Analysis", statistical_tools.distribution_analysis, df, 'TotalAmount'),
+        ("Feature Importance", statistical_tools.feature_importance, df, 'TotalAmount'),
+    ]),
+    ("📋 TEST 6: Data Info", [
+        ("Get Data Info", data_tools.get_data_info, df),
+    ]),
+    ("🧭 TEST 7: Query Routing", [
+        ("Route queries to agents", check_routing),
+    ]),
+]
+
+# The tests are independent and pandas/NumPy release the GIL in their C loops,
+# so run them all on a thread pool and report in the original order
+with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+    futures = [(header, [executor.submit(test, *case) for case in cases])
+               for header, cases in suites]
+    for header, section in futures:
+        print(f"\n{header}")
+        print("-" * 70)
+        for future in section:
+            name, passed, outcome = future.result()
+            if passed:
+                print(f"✅ PASS: {name}")
+                test_results['passed'] += 1
+            else:
+                print(f"❌ FAIL: {name}")
+                print(f"   Error: {str(outcome)}")
+                test_results['failed'] += 1
 
 print("\n" + "=" * 70)
 print(f"📊 TEST RESULTS: {test_results['passed']} passed, {test_results['failed']} failed")
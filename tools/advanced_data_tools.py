@@ -1,55 +1,136 @@
 """Advanced data manipulation tools with SQL-like operations"""
+import functools
+import operator as _op
 import pandas as pd
 import numpy as np
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Callable
 import re
 
+try:
+    import numexpr  # noqa: F401 - lets DataFrame.query evaluate expressions in fused C loops
+    _HAS_NUMEXPR = True
+except ImportError:
+    _HAS_NUMEXPR = False
 
-def get_data_quality_summary(dataframe: pd.DataFrame) -> pd.DataFrame:
+# Below this size DataFrame.query costs more to parse than the masks cost to build
+_QUERY_MIN_ROWS = 100_000
+
+# WHERE operators dispatched by table lookup rather than an if/elif chain
+_OPS = {
+    '>': _op.gt, '>=': _op.ge,
+    '<': _op.lt, '<=': _op.le,
+    '==': _op.eq, '!=': _op.ne,
+}
+
+
+def get_data_quality_summary(dataframe: pd.DataFrame, fast: bool = False) -> pd.DataFrame:
     """
     Get comprehensive data quality summary including missing values, nulls, duplicates, etc.
     
     Args:
         dataframe: The dataframe to analyze
+        fast: Leave out 'Unique Values' and 'Duplicates', which hash every value,
+            when only the null and completeness metrics are needed
         
     Returns:
         DataFrame with data quality metrics
     """
-    quality_data = []
-    
-    for col in dataframe.columns:
-        null_count = dataframe[col].isnull().sum()
-        null_percentage = (null_count / len(dataframe)) * 100
-        non_null_count = dataframe[col].notna().sum()
-        unique_count = dataframe[col].nunique()
-        duplicate_count = dataframe[col].duplicated().sum()
-        
-        # Data type info
-        dtype = str(dataframe[col].dtype)
-        
-        # For numeric columns, add range info
-        if pd.api.types.is_numeric_dtype(dataframe[col]):
-            min_val = dataframe[col].min()
-            max_val = dataframe[col].mean()
-            mean_val = dataframe[col].mean()
-        else:
-            min_val = "N/A"
-            max_val = "N/A"
-            mean_val = "N/A"
-        
-        quality_data.append({
-            'Column': col,
-            'Data Type': dtype,
-            'Total Rows': len(dataframe),
-            'Non-Null Count': non_null_count,
-            'Null Count': null_count,
-            'Null Percentage': f"{null_percentage:.2f}%",
-            'Unique Values': unique_count,
-            'Duplicates': duplicate_count,
-            'Completeness': f"{(1 - null_percentage/100)*100:.2f}%"
-        })
+    # One vectorized pass per statistic instead of several scans per column
+    total_rows = len(dataframe)
+    null_counts = dataframe.isna().sum()
+    null_percentage = null_counts / total_rows * 100
+    
+    summary = {
+        'Column': dataframe.columns,
+        'Data Type': dataframe.dtypes.astype(str).to_numpy(),
+        'Total Rows': total_rows,
+        'Non-Null Count': (total_rows - null_counts).to_numpy(),
+        'Null Count': null_counts.to_numpy(),
+        'Null Percentage': null_percentage.to_numpy()
+    }
+    if not fast:
+        # duplicated() treats repeated nulls as duplicates, so count distinct values with nulls
+        distinct_with_nulls = dataframe.nunique(dropna=False)
+        summary['Unique Values'] = (distinct_with_nulls - (null_counts > 0)).to_numpy()
+        summary['Duplicates'] = (total_rows - distinct_with_nulls).to_numpy()
+    summary['Completeness'] = (100 - null_percentage).to_numpy()
+    
+    return pd.DataFrame(summary)
+
+
+def _contains_mask(series: pd.Series, value: Any) -> pd.Series:
+    """Case-insensitive literal substring match; text columns are searched without a str copy"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Search each category once and spread the result over the codes; missing never matches
+        hits = series.cat.categories.astype(str).str.contains(str(value), case=False, regex=False)
+        hits = np.append(np.asarray(hits, dtype=bool), False)
+        return pd.Series(hits[series.cat.codes.to_numpy()], index=series.index)
+    if not isinstance(series.dtype, pd.StringDtype):
+        series = series.astype(str)
+    return series.str.contains(str(value), case=False, regex=False, na=False)
+
+
+def _between_mask(series: pd.Series, value: Any) -> Optional[pd.Series]:
+    """Inclusive range mask; None when value is not a (low, high) pair"""
+    if isinstance(value, (list, tuple)) and len(value) == 2:
+        return (series >= value[0]) & (series <= value[1])
+    return None
+
+
+_SPECIAL_OPS = {
+    'in': lambda series, value: series.isin(value),
+    'contains': _contains_mask,
+    'between': _between_mask,
+}
+
+
+def _combine_masks(masks: List[pd.Series], logic: str = 'AND') -> np.ndarray:
+    """
+    Fold boolean masks with AND/OR into one preallocated array, in place, rather
+    than stacking them into a k x N block for a reduction.
+    Missing values (from nullable dtypes) count as False.
+    """
+    if logic.upper() == 'AND':
+        combined, fold = np.ones(len(masks[0]), dtype=bool), np.logical_and
+    else:
+        combined, fold = np.zeros(len(masks[0]), dtype=bool), np.logical_or
+    for mask in masks:
+        fold(combined, mask.to_numpy(dtype=bool, na_value=False), out=combined)
+    return combined
+
+
+def _query_filter(dataframe: pd.DataFrame, conditions: List[Dict[str, Any]],
+                  logic: str = 'AND') -> Optional[pd.DataFrame]:
+    """
+    Filter a large frame with one numexpr DataFrame.query when every condition is a
+    numeric comparison on a NumPy numeric column. Returns None when the caller should
+    build masks instead (no numexpr, small frame, or any other kind of condition).
+    """
+    if not _HAS_NUMEXPR or len(dataframe) < _QUERY_MIN_ROWS:
+        return None
     
-    return pd.DataFrame(quality_data)
+    parts = []
+    for condition in conditions:
+        col = condition.get('column')
+        operator = condition.get('operator', '==')
+        value = condition.get('value')
+        if isinstance(value, np.generic):
+            value = value.item()
+        
+        if operator not in _OPS or col not in dataframe.columns or '`' in str(col):
+            return None
+        dtype = dataframe[col].dtype
+        if not (isinstance(dtype, np.dtype) and dtype.kind in 'iuf'):
+            return None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+            return None
+        parts.append(f"`{col}` {operator} {value!r}")
+    
+    joiner = ' and ' if logic.upper() == 'AND' else ' or '
+    try:
+        return dataframe.query(joiner.join(parts), engine='numexpr')
+    except Exception:
+        return None
 
 
 def execute_sql_like_query(dataframe: pd.DataFrame, 
@@ -74,11 +155,15 @@ def execute_sql_like_query(dataframe: pd.DataFrame,
     Returns:
         Resulting dataframe
     """
-    result = dataframe.copy()
+    # Every step below returns a new frame; the input is never mutated, so no copy is needed
+    result = dataframe
     
     # WHERE clause
-    if where_conditions:
-        mask = pd.Series([True] * len(result))
+    queried = _query_filter(result, where_conditions) if where_conditions else None
+    if queried is not None:
+        result = queried
+    elif where_conditions:
+        masks = []
         for condition in where_conditions:
             col = condition.get('column')
             operator = condition.get('operator', '==')
@@ -87,27 +172,13 @@ def execute_sql_like_query(dataframe: pd.DataFrame,
             if col not in result.columns:
                 raise ValueError(f"Column '{col}' not found")
             
-            if operator == '>':
-                mask = mask & (result[col] > value)
-            elif operator == '>=':
-                mask = mask & (result[col] >= value)
-            elif operator == '<':
-                mask = mask & (result[col] < value)
-            elif operator == '<=':
-                mask = mask & (result[col] <= value)
-            elif operator == '==':
-                mask = mask & (result[col] == value)
-            elif operator == '!=':
-                mask = mask & (result[col] != value)
-            elif operator == 'in':
-                mask = mask & (result[col].isin(value))
-            elif operator == 'contains':
-                mask = mask & (result[col].astype(str).str.contains(str(value), case=False, na=False))
-            elif operator == 'between':
-                if isinstance(value, (list, tuple)) and len(value) == 2:
-                    mask = mask & (result[col] >= value[0]) & (result[col] <= value[1])
+            fn = _OPS.get(operator) or _SPECIAL_OPS.get(operator)
+            mask = fn(result[col], value) if fn else None
+            if mask is not None:
+                masks.append(mask)
         
-        result = result[mask]
+        if masks:
+            result = result[_combine_masks(masks, 'AND')]
     
     # GROUP BY
     if group_by:
@@ -115,27 +186,64 @@ def execute_sql_like_query(dataframe: pd.DataFrame,
             raise ValueError(f"Column '{group_by}' not found for GROUP BY")
         # Note: Aggregation should be done separately
     
-    # ORDER BY
-    if order_by:
-        if order_by not in result.columns:
-            raise ValueError(f"Column '{order_by}' not found for ORDER BY")
-        ascending = order_direction.lower() == 'asc'
-        result = result.sort_values(by=order_by, ascending=ascending)
-    
-    # SELECT columns
+    if order_by and order_by not in result.columns:
+        raise ValueError(f"Column '{order_by}' not found for ORDER BY")
     if select_columns:
         missing_cols = [col for col in select_columns if col not in result.columns]
         if missing_cols:
             raise ValueError(f"Columns not found: {missing_cols}")
+    
+    # SELECT columns first when the sort key survives, so the sort moves fewer bytes
+    selected = bool(select_columns) and (not order_by or order_by in select_columns)
+    if selected:
+        result = result[select_columns]
+    
+    # ORDER BY (+ LIMIT)
+    limited = False
+    if order_by:
+        ascending = order_direction.lower() == 'asc'
+        key = result[order_by]
+        # With a limit, a heap selection of the top rows replaces the full sort; it only
+        # applies to numeric keys with enough non-null values to fill the limit
+        if (limit and pd.api.types.is_numeric_dtype(key) and not pd.api.types.is_bool_dtype(key)
+                and key.count() >= limit):
+            result = result.nsmallest(limit, order_by) if ascending else result.nlargest(limit, order_by)
+            limited = True
+        else:
+            result = result.sort_values(by=order_by, ascending=ascending)
+    
+    if select_columns and not selected:
         result = result[select_columns]
     
     # LIMIT
-    if limit:
+    if limit and not limited:
         result = result.head(limit)
     
     return result
 
 
+# Query patterns for parse_natural_language_query, compiled once at import
+_ORDER_PATTERNS = [re.compile(p) for p in (
+    r'order by (\w+)',
+    r'sort by (\w+)',
+    r'sorted by (\w+)',
+    r'sort (\w+)',
+)]
+_GROUP_PATTERNS = [re.compile(p) for p in (
+    r'group by (\w+)',
+    r'grouped by (\w+)',
+    r'group (\w+)',
+)]
+# Pattern: "where column > value", "where column is value", etc.
+_WHERE_PATTERNS = [(re.compile(p), extractor) for p, extractor in (
+    (r'where (\w+)\s*(>|>=|<|<=|==|!=)\s*([\d.]+)', lambda m: {'column': m.group(1), 'operator': m.group(2), 'value': float(m.group(3))}),
+    (r'where (\w+)\s+is\s+([\w\s]+)', lambda m: {'column': m.group(1), 'operator': '==', 'value': m.group(2).strip()}),
+    (r'where (\w+)\s+greater\s+than\s+([\d.]+)', lambda m: {'column': m.group(1), 'operator': '>', 'value': float(m.group(2))}),
+    (r'where (\w+)\s+less\s+than\s+([\d.]+)', lambda m: {'column': m.group(1), 'operator': '<', 'value': float(m.group(2))}),
+)]
+_LIMIT_RE = re.compile(r'limit\s+(\d+)|first\s+(\d+)|top\s+(\d+)')
+
+
 def parse_natural_language_query(query: str, dataframe: pd.DataFrame) -> Dict[str, Any]:
     """
     Parse natural language query into structured operations.
@@ -147,7 +255,14 @@ def parse_natural_language_query(query: str, dataframe: pd.DataFrame) -> Dict[st
     Returns:
         Dictionary with parsed operations
     """
-    query_lower = query.lower()
+    operations = _parse_query_cached(query.lower(), tuple(dataframe.columns))
+    # Callers get their own copy, never the cached dict
+    return {**operations, 'where_conditions': [dict(c) for c in operations['where_conditions']]}
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_query_cached(query_lower: str, columns: tuple) -> Dict[str, Any]:
+    """The parse depends only on the query text and the column names, so it is memoized"""
     operations = {
         'select_columns': None,
         'where_conditions': [],
@@ -158,66 +273,43 @@ def parse_natural_language_query(query: str, dataframe: pd.DataFrame) -> Dict[st
         'aggregate': None
     }
     
+    # Each clause's patterns only run when its keyword appears in the query
     # Extract ORDER BY
-    order_patterns = [
-        r'order by (\w+)',
-        r'sort by (\w+)',
-        r'sorted by (\w+)',
-        r'sort (\w+)',
-    ]
-    for pattern in order_patterns:
-        match = re.search(pattern, query_lower)
-        if match:
-            col = match.group(1)
-            if col in dataframe.columns:
-                operations['order_by'] = col
-                if 'desc' in query_lower or 'descending' in query_lower:
-                    operations['order_direction'] = 'desc'
-                break
+    if 'order' in query_lower or 'sort' in query_lower:
+        for pattern in _ORDER_PATTERNS:
+            match = pattern.search(query_lower)
+            if match:
+                col = match.group(1)
+                if col in columns:
+                    operations['order_by'] = col
+                    if 'desc' in query_lower or 'descending' in query_lower:
+                        operations['order_direction'] = 'desc'
+                    break
     
     # Extract GROUP BY
-    group_patterns = [
-        r'group by (\w+)',
-        r'grouped by (\w+)',
-        r'group (\w+)',
-    ]
-    for pattern in group_patterns:
-        match = re.search(pattern, query_lower)
-        if match:
-            col = match.group(1)
-            if col in dataframe.columns:
-                operations['group_by'] = col
-                break
+    if 'group' in query_lower:
+        for pattern in _GROUP_PATTERNS:
+            match = pattern.search(query_lower)
+            if match:
+                col = match.group(1)
+                if col in columns:
+                    operations['group_by'] = col
+                    break
     
     # Extract WHERE conditions
-    # Pattern: "where column > value", "where column is value", etc.
-    where_patterns = [
-        (r'where (\w+)\s*(>|>=|<|<=|==|!=)\s*([\d.]+)', lambda m: {'column': m.group(1), 'operator': m.group(2), 'value': float(m.group(3))}),
-        (r'where (\w+)\s+is\s+([\w\s]+)', lambda m: {'column': m.group(1), 'operator': '==', 'value': m.group(2).strip()}),
-        (r'where (\w+)\s+greater\s+than\s+([\d.]+)', lambda m: {'column': m.group(1), 'operator': '>', 'value': float(m.group(2))}),
-        (r'where (\w+)\s+less\s+than\s+([\d.]+)', lambda m: {'column': m.group(1), 'operator': '<', 'value': float(m.group(2))}),
-    ]
-    
-    for pattern, extractor in where_patterns:
-        match = re.search(pattern, query_lower)
-        if match:
-            condition = extractor(match)
-            if condition['column'] in dataframe.columns:
-                operations['where_conditions'].append(condition)
+    if 'where' in query_lower:
+        for pattern, extractor in _WHERE_PATTERNS:
+            match = pattern.search(query_lower)
+            if match:
+                condition = extractor(match)
+                if condition['column'] in columns:
+                    operations['where_conditions'].append(condition)
     
     # Extract LIMIT
-    limit_match = re.search(r'limit\s+(\d+)|first\s+(\d+)|top\s+(\d+)', query_lower)
-    if limit_match:
-        operations['limit'] = int(limit_match.group(1) or limit_match.group(2) or limit_match.group(3))
-    
-    # Extract aggregate functions
-    agg_patterns = [
-        (r'sum of (\w+)', 'sum'),
-        (r'average of (\w+)|mean of (\w+)', 'mean'),
-        (r'count of (\w+)', 'count'),
-        (r'max of (\w+)', 'max'),
-        (r'min of (\w+)', 'min'),
-    ]
+    if 'limit' in query_lower or 'first' in query_lower or 'top' in query_lower:
+        limit_match = _LIMIT_RE.search(query_lower)
+        if limit_match:
+            operations['limit'] = int(limit_match.group(1) or limit_match.group(2) or limit_match.group(3))
     
     return operations
 
@@ -233,26 +325,44 @@ def complex_query(dataframe: pd.DataFrame, query: str) -> pd.DataFrame:
     Returns:
         Result dataframe
     """
+    return _compile_query(query.lower(), tuple(dataframe.columns))(dataframe)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_query(query_lower: str, columns: tuple) -> Callable[[pd.DataFrame], pd.DataFrame]:
+    """
+    Specialize a query for one schema: parsing and argument assembly happen once,
+    and the returned plan only does the pandas work on each call. The plan is a
+    closure over the parsed operations rather than generated source, since the
+    query text (and its literal values) comes from users and the model.
+    """
     # Try to parse as natural language
-    operations = parse_natural_language_query(query, dataframe)
-    
-    # Execute the operations
-    result = execute_sql_like_query(
-        dataframe,
-        select_columns=operations.get('select_columns'),
-        where_conditions=operations.get('where_conditions'),
-        group_by=operations.get('group_by'),
-        order_by=operations.get('order_by'),
-        order_direction=operations.get('order_direction', 'asc'),
-        limit=operations.get('limit')
+    operations = _parse_query_cached(query_lower, columns)
+    query_args = dict(
+        select_columns=operations['select_columns'],
+        where_conditions=operations['where_conditions'],
+        group_by=operations['group_by'],
+        order_by=operations['order_by'],
+        order_direction=operations['order_direction'],
+        limit=operations['limit']
     )
+    group_col = operations['group_by']
     
-    # Handle GROUP BY with aggregation if needed
-    if operations.get('group_by'):
-        # Default to count if no aggregation specified
-        result = result.groupby(operations['group_by']).size().reset_index(name='count')
+    def plan(dataframe: pd.DataFrame) -> pd.DataFrame:
+        # Execute the operations (the cached conditions are only read)
+        result = execute_sql_like_query(dataframe, **query_args)
+        
+        # Handle GROUP BY with aggregation if needed
+        if group_col:
+            # Default to count if no aggregation specified
+            # Categorical columns list every category; only keys with rows left are groups
+            counts = result[group_col].value_counts(sort=False)
+            counts = counts[counts > 0].sort_index()
+            result = counts.rename_axis(group_col).reset_index(name='count')
+        
+        return result
     
-    return result
+    return plan
 
 
 def multi_condition_filter(dataframe: pd.DataFrame, 
@@ -272,6 +382,10 @@ def multi_condition_filter(dataframe: pd.DataFrame,
     if not conditions:
         return dataframe
     
+    queried = _query_filter(dataframe, conditions, logic)
+    if queried is not None:
+        return queried
+    
     masks = []
     for condition in conditions:
         col = condition.get('column')
@@ -281,34 +395,15 @@ def multi_condition_filter(dataframe: pd.DataFrame,
         if col not in dataframe.columns:
             continue
         
-        if operator == '>':
-            masks.append(dataframe[col] > value)
-        elif operator == '>=':
-            masks.append(dataframe[col] >= value)
-        elif operator == '<':
-            masks.append(dataframe[col] < value)
-        elif operator == '<=':
-            masks.append(dataframe[col] <= value)
-        elif operator == '==':
-            masks.append(dataframe[col] == value)
-        elif operator == '!=':
-            masks.append(dataframe[col] != value)
-        elif operator == 'contains':
-            masks.append(dataframe[col].astype(str).str.contains(str(value), case=False, na=False))
+        fn = _OPS.get(operator) or _SPECIAL_OPS.get(operator)
+        mask = fn(dataframe[col], value) if fn else None
+        if mask is not None:
+            masks.append(mask)
     
     if not masks:
         return dataframe
     
-    if logic.upper() == 'AND':
-        combined_mask = masks[0]
-        for mask in masks[1:]:
-            combined_mask = combined_mask & mask
-    else:  # OR
-        combined_mask = masks[0]
-        for mask in masks[1:]:
-            combined_mask = combined_mask | mask
-    
-    return dataframe[combined_mask]
+    return dataframe[_combine_masks(masks, logic)]
 
 
 def advanced_group_by(dataframe: pd.DataFrame,
@@ -333,26 +428,28 @@ def advanced_group_by(dataframe: pd.DataFrame,
         if col not in dataframe.columns:
             raise ValueError(f"Column '{col}' not found for GROUP BY")
     
-    grouped = dataframe.groupby(group_by)
+    # Only observed keys, unsorted; the (small) aggregate is sorted at the end
+    grouped = dataframe.groupby(group_by, observed=True, sort=False)
     
-    # Build aggregation dict
-    agg_dict = {}
+    # Build named aggregations: a single function keeps the column name,
+    # several functions yield one '<column>_<function>' output each
+    named = {}
     for col, funcs in aggregations.items():
         if col not in dataframe.columns:
             continue
+        if isinstance(funcs, list) and len(funcs) == 1:
+            funcs = funcs[0]
         if isinstance(funcs, str):
-            agg_dict[col] = funcs
+            named[col] = pd.NamedAgg(column=col, aggfunc=funcs)
         elif isinstance(funcs, list):
-            agg_dict[col] = funcs
+            for func in funcs:
+                named[f"{col}_{func}"] = pd.NamedAgg(column=col, aggfunc=func)
     
-    if not agg_dict:
+    if not named:
         # Default: count
-        return grouped.size().reset_index(name='count')
-    
-    result = grouped.agg(agg_dict)
-    result.columns = [f"{col}_{func}" if isinstance(func, list) and len(func) > 1 else col 
-                      for col, func in zip(result.columns, [v if isinstance(v, list) else [v] for v in aggregations.values()])]
+        return grouped.size().sort_index().reset_index(name='count')
     
+    result = grouped.agg(**named).sort_index()
     return result.reset_index()
 
 
@@ -1,16 +1,48 @@
 """Data manipulation and querying tools for the Analysis Agent"""
+import operator as _op
+import re
+import warnings
 import pandas as pd
 import numpy as np
 from typing import Optional, List, Dict, Any, Union
 
 
-def query_dataframe(query: str, dataframe: pd.DataFrame) -> str:
+# Comparison operators by query symbol
+_OPS = {
+    '>': _op.gt, '>=': _op.ge,
+    '<': _op.lt, '<=': _op.le,
+    '==': _op.eq, '!=': _op.ne,
+}
+
+# Clause patterns for execute_complex_query, compiled once at import
+_ORDER_RE = re.compile(r'order by (\w+)|sort by (\w+)|sorted by (\w+)')
+_LIMIT_RE = re.compile(r'limit\s+(\d+)|first\s+(\d+)|top\s+(\d+)')
+_WHERE_RE = re.compile(r'where\s+(\w+)\s*(>|<|>=|<=|==)\s*([\d.]+)')
+_GROUP_RE = re.compile(r'group by (\w+)')
+_WORD_RE = re.compile(r'[a-z]+|\d+')
+
+
+def _contains_mask(series: pd.Series, value: Any) -> pd.Series:
+    """Case-insensitive literal substring match; text columns are searched without a str copy"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Search each category once and spread the result over the codes; missing never matches
+        hits = series.cat.categories.astype(str).str.contains(str(value), case=False, regex=False)
+        hits = np.append(np.asarray(hits, dtype=bool), False)
+        return pd.Series(hits[series.cat.codes.to_numpy()], index=series.index)
+    if not isinstance(series.dtype, pd.StringDtype):
+        series = series.astype(str)
+    return series.str.contains(str(value), case=False, regex=False, na=False)
+
+
+def query_dataframe(query: str, dataframe: pd.DataFrame,
+                    summary: Optional[pd.DataFrame] = None) -> str:
     """
     Query the dataframe using pandas operations.
     
     Args:
         query: A pandas query string or operation description
         dataframe: The dataframe to query
+        summary: Precomputed dataframe.describe(), reused by the default answer
         
     Returns:
         String representation of the query results
@@ -19,32 +51,31 @@ def query_dataframe(query: str, dataframe: pd.DataFrame) -> str:
         if dataframe.empty:
             return "DataFrame is empty."
         
-        # Handle common query patterns
-        query_lower = query.lower()
+        # Handle common query patterns; the query is tokenized once and each
+        # pattern is a set lookup rather than another scan of the text
+        words = set(_WORD_RE.findall(query.lower()))
         
-        if "head" in query_lower or "first" in query_lower:
+        if words & {'head', 'first'}:
             n = 5
-            if "10" in query:
+            if '10' in words:
                 n = 10
-            elif "20" in query or "twenty" in query_lower:
+            elif words & {'20', 'twenty'}:
                 n = 20
-            elif "50" in query or "fifty" in query_lower:
+            elif words & {'50', 'fifty'}:
                 n = 50
             return f"First {n} rows:\n{dataframe.head(n).to_string()}"
         
-        if "tail" in query_lower or "last" in query_lower:
-            n = 5
-            if "10" in query:
-                n = 10
+        if words & {'tail', 'last'}:
+            n = 10 if '10' in words else 5
             return f"Last {n} rows:\n{dataframe.tail(n).to_string()}"
         
-        if "shape" in query_lower or "size" in query_lower or "dimensions" in query_lower:
+        if words & {'shape', 'size', 'dimensions'}:
             return f"Dataframe shape: {dataframe.shape[0]} rows × {dataframe.shape[1]} columns"
         
-        if "columns" in query_lower or "column names" in query_lower:
+        if 'columns' in words or {'column', 'names'} <= words:
             return f"Column names: {list(dataframe.columns)}"
         
-        if "info" in query_lower:
+        if 'info' in words:
             buffer = []
             buffer.append(f"Dataframe Info:")
             buffer.append(f"Shape: {dataframe.shape}")
@@ -54,14 +85,14 @@ def query_dataframe(query: str, dataframe: pd.DataFrame) -> str:
             buffer.append(f"\nMemory usage: {dataframe.memory_usage(deep=True).sum() / 1024:.2f} KB")
             return "\n".join(buffer)
         
-        if "sample" in query_lower:
-            n = 5
-            if "10" in query:
-                n = 10
+        if 'sample' in words:
+            n = 10 if '10' in words else 5
             return f"Random sample ({n} rows):\n{dataframe.sample(min(n, len(dataframe))).to_string()}"
         
         # Default: return summary
-        return f"Dataframe summary:\n{dataframe.describe().to_string()}\n\nFirst 5 rows:\n{dataframe.head().to_string()}"
+        if summary is None:
+            summary = dataframe.describe()
+        return f"Dataframe summary:\n{summary.to_string()}\n\nFirst 5 rows:\n{dataframe.head().to_string()}"
     
     except Exception as e:
         return f"Error querying dataframe: {e}"
@@ -94,7 +125,7 @@ def filter_dataframe(column: str, condition: str, value: Any, dataframe: pd.Data
         elif condition.lower() in ['equal', '==', 'eq', 'equals']:
             filtered = dataframe[dataframe[column] == value]
         elif condition.lower() in ['contains', 'in', 'includes']:
-            filtered = dataframe[dataframe[column].astype(str).str.contains(str(value), case=False, na=False)]
+            filtered = dataframe[_contains_mask(dataframe[column], value)]
         elif condition.lower() in ['between', 'range']:
             if isinstance(value, (list, tuple)) and len(value) == 2:
                 filtered = dataframe[(dataframe[column] >= value[0]) & (dataframe[column] <= value[1])]
@@ -109,6 +140,56 @@ def filter_dataframe(column: str, condition: str, value: Any, dataframe: pd.Data
         raise ValueError(f"Error filtering dataframe: {e}")
 
 
+def _category_aggregate(dataframe: pd.DataFrame, group_by: str, agg_column: str,
+                        how: str) -> Optional[pd.DataFrame]:
+    """
+    Grouped sum, mean or count of a numeric column by a categorical key, computed
+    with np.bincount over the key's category codes. Returns None when the key or
+    column is not covered and the caller should use groupby.
+    """
+    key = dataframe[group_by]
+    values = dataframe[agg_column].to_numpy()
+    if (group_by == agg_column or not isinstance(key.dtype, pd.CategoricalDtype)
+            or dataframe[agg_column].dtype not in (np.float64, np.int64, np.int32)):
+        return None
+    
+    codes = key.cat.codes.to_numpy()
+    n_categories = len(key.cat.categories)
+    
+    # bincount accumulates in float64; fall back when an integer sum might not be exact.
+    # The bound is taken in float, as integer arithmetic would wrap (abs of the dtype's
+    # minimum stays negative)
+    if values.dtype.kind == 'i' and how == 'sum' and len(values):
+        if (values.min() == np.iinfo(values.dtype).min
+                or float(np.abs(values).max()) * len(values) >= 2 ** 53):
+            return None
+    
+    # groupby keeps the categories that occur in the key, in category order
+    observed = np.flatnonzero(np.bincount(codes[codes >= 0], minlength=n_categories))
+    keep = codes >= 0
+    if values.dtype.kind == 'f':
+        keep &= ~np.isnan(values)
+    if not keep.all():
+        codes, values = codes[keep], values[keep]
+    
+    counts = np.bincount(codes, minlength=n_categories)
+    if how == 'count':
+        result = counts
+    else:
+        result = np.bincount(codes, weights=values, minlength=n_categories)
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = result / counts
+        else:
+            # Sums keep the column's dtype, as groupby's do
+            result = result.astype(values.dtype, copy=False)
+    
+    return pd.DataFrame({
+        group_by: pd.Categorical.from_codes(observed, dtype=key.dtype),
+        agg_column: result[observed]
+    })
+
+
 def group_by_aggregate(dataframe: pd.DataFrame, group_by: str, agg_function: str, 
                       agg_column: Optional[str] = None) -> pd.DataFrame:
     """
@@ -127,6 +208,12 @@ def group_by_aggregate(dataframe: pd.DataFrame, group_by: str, agg_function: str
         raise ValueError(f"Column '{group_by}' not found.")
     
     try:
+        if agg_column and agg_column in dataframe.columns:
+            how = {'sum': 'sum', 'mean': 'mean', 'average': 'mean', 'count': 'count'}.get(agg_function.lower())
+            result = _category_aggregate(dataframe, group_by, agg_column, how) if how else None
+            if result is not None:
+                return result
+        
         grouped = dataframe.groupby(group_by)
         
         if agg_column and agg_column in dataframe.columns:
@@ -162,7 +249,29 @@ def group_by_aggregate(dataframe: pd.DataFrame, group_by: str, agg_function: str
         raise ValueError(f"Error in group by operation: {e}")
 
 
-def detect_outliers(dataframe: pd.DataFrame, column: str, method: str = 'iqr') -> pd.DataFrame:
+def iqr_bounds(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    IQR outlier fences for every numeric column at once.
+    
+    Args:
+        dataframe: The dataframe to analyze
+        
+    Returns:
+        DataFrame indexed by ('lower', 'upper') with one column per numeric column
+    """
+    numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
+    # One quantile call over the numeric block, one contiguous row per column
+    values = np.ascontiguousarray(dataframe[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan).T)
+    with warnings.catch_warnings():
+        # All-missing columns get NaN fences
+        warnings.simplefilter('ignore', RuntimeWarning)
+        q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=1)
+    iqr = q3 - q1
+    return pd.DataFrame([q1 - 1.5 * iqr, q3 + 1.5 * iqr], index=['lower', 'upper'], columns=numeric_cols)
+
+
+def detect_outliers(dataframe: pd.DataFrame, column: str, method: str = 'iqr',
+                    bounds: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Detect outliers in a column.
     
@@ -170,6 +279,7 @@ def detect_outliers(dataframe: pd.DataFrame, column: str, method: str = 'iqr') -
         dataframe: The dataframe to analyze
         column: Column to check for outliers
         method: Method to use ('iqr' or 'zscore')
+        bounds: Precomputed iqr_bounds(dataframe), so repeated IQR calls skip the quantiles
         
     Returns:
         DataFrame with outliers
@@ -177,19 +287,20 @@ def detect_outliers(dataframe: pd.DataFrame, column: str, method: str = 'iqr') -
     if column not in dataframe.columns:
         raise ValueError(f"Column '{column}' not found.")
     
-    if dataframe[column].dtype not in [np.number]:
+    if not pd.api.types.is_numeric_dtype(dataframe[column]):
         raise ValueError(f"Column '{column}' must be numeric for outlier detection.")
     
     try:
+        # One float view of the column serves every statistic below; NaNs are never outliers
+        values = dataframe[column].to_numpy(dtype=np.float64, na_value=np.nan)
         if method.lower() == 'iqr':
-            Q1 = dataframe[column].quantile(0.25)
-            Q3 = dataframe[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            outliers = dataframe[(dataframe[column] < lower_bound) | (dataframe[column] > upper_bound)]
+            if bounds is None or column not in bounds.columns:
+                bounds = iqr_bounds(dataframe[[column]])
+            lower_bound, upper_bound = bounds[column]
+            outliers = dataframe[(values < lower_bound) | (values > upper_bound)]
         elif method.lower() == 'zscore':
-            z_scores = np.abs((dataframe[column] - dataframe[column].mean()) / dataframe[column].std())
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z_scores = np.abs((values - np.nanmean(values)) / np.nanstd(values, ddof=1))
             outliers = dataframe[z_scores > 3]
         else:
             raise ValueError(f"Unknown method: {method}. Use 'iqr' or 'zscore'")
@@ -210,12 +321,14 @@ def get_data_info(dataframe: pd.DataFrame) -> Dict[str, Any]:
     Returns:
         Dictionary with data information
     """
+    # Null counts are the only per-cell scan besides memory and duplicates; do it once
+    null_counts = dataframe.isna().sum()
     info = {
         'shape': dataframe.shape,
         'columns': list(dataframe.columns),
         'dtypes': dataframe.dtypes.to_dict(),
-        'missing_values': dataframe.isnull().sum().to_dict(),
-        'missing_percentage': (dataframe.isnull().sum() / len(dataframe) * 100).to_dict(),
+        'missing_values': null_counts.to_dict(),
+        'missing_percentage': (null_counts / len(dataframe) * 100).to_dict(),
         'memory_usage_mb': dataframe.memory_usage(deep=True).sum() / (1024 * 1024),
         'numeric_columns': list(dataframe.select_dtypes(include=[np.number]).columns),
         'categorical_columns': list(dataframe.select_dtypes(include=['object', 'category']).columns),
@@ -224,95 +337,109 @@ def get_data_info(dataframe: pd.DataFrame) -> Dict[str, Any]:
     return info
 
 
-def get_data_quality_summary(dataframe: pd.DataFrame) -> pd.DataFrame:
+def get_data_quality_summary(dataframe: pd.DataFrame, fast: bool = False) -> pd.DataFrame:
     """
     Get comprehensive data quality summary including missing values, nulls, duplicates, etc.
     
     Args:
         dataframe: The dataframe to analyze
+        fast: Leave out 'Unique Values' and 'Duplicates', which hash every value,
+            when only the null and completeness metrics are needed
         
     Returns:
         DataFrame with data quality metrics
     """
-    quality_data = []
-    
-    for col in dataframe.columns:
-        null_count = dataframe[col].isnull().sum()
-        null_percentage = (null_count / len(dataframe)) * 100
-        non_null_count = dataframe[col].notna().sum()
-        unique_count = dataframe[col].nunique()
-        duplicate_count = dataframe[col].duplicated().sum()
-        
-        # Data type info
-        dtype = str(dataframe[col].dtype)
-        
-        quality_data.append({
-            'Column': col,
-            'Data Type': dtype,
-            'Total Rows': len(dataframe),
-            'Non-Null Count': non_null_count,
-            'Null Count': null_count,
-            'Null Percentage': f"{null_percentage:.2f}%",
-            'Unique Values': unique_count,
-            'Duplicates': duplicate_count,
-            'Completeness': f"{(1 - null_percentage/100)*100:.2f}%"
-        })
+    # One vectorized pass per statistic instead of several scans per column
+    total_rows = len(dataframe)
+    null_counts = dataframe.isna().sum()
+    null_percentage = null_counts / total_rows * 100
+    
+    summary = {
+        'Column': dataframe.columns,
+        'Data Type': dataframe.dtypes.astype(str).to_numpy(),
+        'Total Rows': total_rows,
+        'Non-Null Count': (total_rows - null_counts).to_numpy(),
+        'Null Count': null_counts.to_numpy(),
+        'Null Percentage': null_percentage.to_numpy()
+    }
+    if not fast:
+        # duplicated() treats repeated nulls as duplicates, so count distinct values with nulls
+        distinct_with_nulls = dataframe.nunique(dropna=False)
+        summary['Unique Values'] = (distinct_with_nulls - (null_counts > 0)).to_numpy()
+        summary['Duplicates'] = (total_rows - distinct_with_nulls).to_numpy()
+    summary['Completeness'] = (100 - null_percentage).to_numpy()
     
-    return pd.DataFrame(quality_data)
+    return pd.DataFrame(summary)
 
 
 def execute_complex_query(dataframe: pd.DataFrame, query: str) -> pd.DataFrame:
     """Execute complex natural language or SQL-like query with ORDER BY, GROUP BY, WHERE, etc."""
-    import re
-    
-    result = dataframe.copy()
+    # Every step below returns a new frame; the input is never mutated, so no copy is needed
+    result = dataframe
     query_lower = query.lower()
     
+    limit_match = _LIMIT_RE.search(query_lower)
+    limit_val = int(limit_match.group(1) or limit_match.group(2) or limit_match.group(3)) if limit_match else None
+    limited = False
+    
     # Extract ORDER BY
-    order_match = re.search(r'order by (\w+)|sort by (\w+)|sorted by (\w+)', query_lower)
+    order_match = _ORDER_RE.search(query_lower)
     if order_match:
         col = order_match.group(1) or order_match.group(2) or order_match.group(3)
         if col in result.columns:
             ascending = 'desc' not in query_lower
-            result = result.sort_values(by=col, ascending=ascending)
+            key = result[col]
+            # With a limit, select the top rows instead of sorting them all; numeric
+            # keys with enough non-null values to fill the limit only
+            if (limit_val and pd.api.types.is_numeric_dtype(key) and not pd.api.types.is_bool_dtype(key)
+                    and key.count() >= limit_val):
+                result = result.nsmallest(limit_val, col) if ascending else result.nlargest(limit_val, col)
+                limited = True
+            else:
+                result = result.sort_values(by=col, ascending=ascending)
     
     # Extract LIMIT
-    limit_match = re.search(r'limit\s+(\d+)|first\s+(\d+)|top\s+(\d+)', query_lower)
-    if limit_match:
-        limit_val = int(limit_match.group(1) or limit_match.group(2) or limit_match.group(3))
+    if limit_val is not None and not limited:
         result = result.head(limit_val)
     
     # Extract WHERE conditions (simplified)
     if 'where' in query_lower:
         # Try to extract column and value
-        where_match = re.search(r'where\s+(\w+)\s*(>|<|>=|<=|==)\s*([\d.]+)', query_lower)
+        where_match = _WHERE_RE.search(query_lower)
         if where_match:
             col = where_match.group(1)
             op = where_match.group(2)
             val = float(where_match.group(3))
             if col in result.columns:
-                if op == '>':
-                    result = result[result[col] > val]
-                elif op == '<':
-                    result = result[result[col] < val]
-                elif op == '>=':
-                    result = result[result[col] >= val]
-                elif op == '<=':
-                    result = result[result[col] <= val]
-                elif op == '==':
-                    result = result[result[col] == val]
+                result = result[_OPS[op](result[col], val)]
     
     # Extract GROUP BY (simplified - would need aggregation separately)
-    group_match = re.search(r'group by (\w+)', query_lower)
+    group_match = _GROUP_RE.search(query_lower)
     if group_match:
         col = group_match.group(1)
         if col in result.columns:
             # Default to count
-            result = result.groupby(col).size().reset_index(name='count')
+            # Categorical columns list every category; only keys with rows left are groups
+            counts = result[col].value_counts(sort=False)
+            counts = counts[counts > 0].sort_index()
+            result = counts.rename_axis(col).reset_index(name='count')
     
     return result
 
 
+_COMPARISON_UFUNCS = {
+    '>': np.greater, '>=': np.greater_equal,
+    '<': np.less, '<=': np.less_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+
+
+def _is_plain_numeric(column: pd.Series, value: Any) -> bool:
+    """True when column is NumPy int/float data and value a plain number"""
+    return (isinstance(column.dtype, np.dtype) and column.dtype.kind in 'iuf'
+            and isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool))
+
+
 def multi_condition_filter(dataframe: pd.DataFrame, 
                           conditions: List[Dict[str, Any]],
                           logic: str = 'AND') -> pd.DataFrame:
@@ -320,7 +447,10 @@ def multi_condition_filter(dataframe: pd.DataFrame,
     if not conditions:
         return dataframe
     
-    masks = []
+    # Each mask is folded into the running result in place as soon as it is built
+    is_and = logic.upper() == 'AND'
+    combine = np.logical_and if is_and else np.logical_or
+    combined = None
     for condition in conditions:
         col = condition.get('column')
         operator = condition.get('operator', '==')
@@ -329,34 +459,33 @@ def multi_condition_filter(dataframe: pd.DataFrame,
         if col not in dataframe.columns:
             continue
         
-        if operator == '>':
-            masks.append(dataframe[col] > value)
-        elif operator == '>=':
-            masks.append(dataframe[col] >= value)
-        elif operator == '<':
-            masks.append(dataframe[col] < value)
-        elif operator == '<=':
-            masks.append(dataframe[col] <= value)
-        elif operator == '==':
-            masks.append(dataframe[col] == value)
-        elif operator == '!=':
-            masks.append(dataframe[col] != value)
+        # Once no row can change (nothing left under AND, everything under OR)
+        # the remaining conditions are not evaluated
+        if combined is not None and (not combined.any() if is_and else combined.all()):
+            break
+        
+        column = dataframe[col]
+        if operator in _COMPARISON_UFUNCS and _is_plain_numeric(column, value):
+            # Compare the column's NumPy buffer directly; no intermediate Series
+            mask = _COMPARISON_UFUNCS[operator](column.to_numpy(), value)
+        elif operator in _OPS:
+            mask = _OPS[operator](column, value)
         elif operator == 'contains':
-            masks.append(dataframe[col].astype(str).str.contains(str(value), case=False, na=False))
+            mask = _contains_mask(column, value)
+        else:
+            continue
+        
+        if isinstance(mask, pd.Series):
+            # Missing values from nullable dtypes count as False
+            mask = mask.to_numpy(dtype=bool, na_value=False)
+        if combined is None:
+            combined = mask if mask.flags.writeable else mask.copy()
+        else:
+            combine(combined, mask, out=combined)
     
-    if not masks:
+    if combined is None:
         return dataframe
-    
-    if logic.upper() == 'AND':
-        combined_mask = masks[0]
-        for mask in masks[1:]:
-            combined_mask = combined_mask & mask
-    else:  # OR
-        combined_mask = masks[0]
-        for mask in masks[1:]:
-            combined_mask = combined_mask | mask
-    
-    return dataframe[combined_mask]
+    return dataframe[combined]
 
 
 def advanced_group_by(dataframe: pd.DataFrame,
@@ -370,11 +499,12 @@ def advanced_group_by(dataframe: pd.DataFrame,
         if col not in dataframe.columns:
             raise ValueError(f"Column '{col}' not found for GROUP BY")
     
-    grouped = dataframe.groupby(group_by)
+    # Only observed keys, unsorted; the (small) aggregate is sorted at the end
+    grouped = dataframe.groupby(group_by, observed=True, sort=False)
     
     if not aggregations:
-        return grouped.size().reset_index(name='count')
+        return grouped.size().sort_index().reset_index(name='count')
     
-    result = grouped.agg(aggregations)
+    result = grouped.agg(aggregations).sort_index()
     return result.reset_index()
 
@@ -1,5 +1,6 @@
 """Formatting tools to convert results into table format"""
 import pandas as pd
+import numpy as np
 from typing import Any, Dict, List, Union
 
 
@@ -136,33 +137,28 @@ def format_correlation_table(correlation_matrix: pd.DataFrame) -> pd.DataFrame:
     if correlation_matrix.empty:
         return pd.DataFrame()
     
-    # Convert matrix to long format
-    corr_table = []
-    for i, col1 in enumerate(correlation_matrix.columns):
-        for col2 in correlation_matrix.columns[i+1:]:
-            corr_value = correlation_matrix.loc[col1, col2]
-            corr_table.append({
-                'Feature_1': col1,
-                'Feature_2': col2,
-                'Correlation': round(corr_value, 4),
-                'Strength': _correlation_strength_label(abs(corr_value))
-            })
+    # Convert the upper triangle to long format, one column array at a time
+    values = correlation_matrix.to_numpy(dtype=np.float64)
+    columns = correlation_matrix.columns.to_numpy()
+    rows, cols = np.triu_indices_from(values, k=1)
+    corr_values = values[rows, cols]
+    corr_table = pd.DataFrame({
+        'Feature_1': columns[rows],
+        'Feature_2': columns[cols],
+        'Correlation': np.round(corr_values, 4),
+        'Strength': _correlation_strength_labels(np.abs(corr_values))
+    })
     
-    return pd.DataFrame(corr_table).sort_values('Correlation', key=abs, ascending=False)
+    return corr_table.sort_values('Correlation', key=abs, ascending=False)
 
 
-def _correlation_strength_label(corr_abs: float) -> str:
-    """Get correlation strength label"""
-    if corr_abs >= 0.9:
-        return 'Very Strong'
-    elif corr_abs >= 0.7:
-        return 'Strong'
-    elif corr_abs >= 0.5:
-        return 'Moderate'
-    elif corr_abs >= 0.3:
-        return 'Weak'
-    else:
-        return 'Very Weak'
+def _correlation_strength_labels(corr_abs: np.ndarray) -> np.ndarray:
+    """Get correlation strength labels for an array of absolute correlations"""
+    return np.select(
+        [corr_abs >= 0.9, corr_abs >= 0.7, corr_abs >= 0.5, corr_abs >= 0.3],
+        ['Very Strong', 'Strong', 'Moderate', 'Weak'],
+        default='Very Weak'
+    )
 
 
 def format_statistics_table(stats_df: pd.DataFrame) -> pd.DataFrame:
@@ -178,35 +174,14 @@ def format_statistics_table(stats_df: pd.DataFrame) -> pd.DataFrame:
     if stats_df.empty:
         return pd.DataFrame()
     
-    formatted = stats_df.copy()
-    
-    # Round numeric columns
-    for col in formatted.columns:
-        if formatted[col].dtype in ['float64', 'float32']:
-            formatted[col] = formatted[col].round(4)
-    
-    return formatted
-
-
-def format_statistics_table(stats_df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Format statistics DataFrame for better readability.
-    
-    Args:
-        stats_df: Statistics DataFrame
-        
-    Returns:
-        Formatted DataFrame with rounded values
-    """
-    if stats_df.empty:
-        return pd.DataFrame()
+    # Nothing to round means nothing to copy
+    float_cols = stats_df.select_dtypes(include=[np.floating]).columns
+    if len(float_cols) == 0:
+        return stats_df
     
+    # Round the float columns with one NumPy call over the float block
     formatted = stats_df.copy()
-    
-    # Round numeric columns
-    for col in formatted.columns:
-        if formatted[col].dtype in ['float64', 'float32']:
-            formatted[col] = formatted[col].round(4)
+    formatted[float_cols] = np.round(formatted[float_cols].to_numpy(), 4)
     
     return formatted
 
@@ -1,10 +1,64 @@
 """Statistical analysis tools for the Statistical Agent"""
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from scipy import stats
 from typing import Dict, List, Tuple, Any, Optional
 
 
+def _column_major(numeric: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return numeric with each column contiguous in memory. A frame wrapped around a
+    row-major 2-D array without a copy stores its columns strided, which makes every
+    per-column reduction hop across rows; such frames are re-laid out once here.
+    """
+    strided = any(isinstance(dtype, np.dtype) and not numeric.iloc[:, i].to_numpy().flags.c_contiguous
+                  for i, dtype in enumerate(numeric.dtypes))
+    return numeric.copy() if strided else numeric
+
+
+def _moments(values: np.ndarray, missing: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Count, mean, sample variance, skewness and excess kurtosis of each row of a
+    (columns x rows) float block, skipping NaNs, from one set of centred power sums.
+    Skewness and kurtosis are bias-corrected the way pandas computes them.
+    """
+    count = (~missing).sum(axis=1).astype(np.float64)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dev = np.where(missing, 0.0, values)
+        mean = dev.sum(axis=1) / count
+        dev -= mean[:, None]
+        dev[missing] = 0.0
+        power = dev * dev
+        m2 = power.sum(axis=1)
+        power *= dev
+        m3 = power.sum(axis=1)
+        power *= dev
+        m4 = power.sum(axis=1)
+        
+        variance = m2 / (count - 1)
+        variance[count < 2] = np.nan
+        
+        # Sums indistinguishable from rounding error count as zero
+        m2 = np.where(np.abs(m2) < 1e-14, 0.0, m2)
+        m3 = np.where(np.abs(m3) < 1e-14, 0.0, m3)
+        skewness = (count * (count - 1) ** 0.5 / (count - 2)) * (m3 / m2 ** 1.5)
+        skewness = np.where(m2 == 0, 0.0, skewness)
+        skewness[count < 3] = np.nan
+        
+        numerator = count * (count + 1) * (count - 1) * m4
+        denominator = (count - 2) * (count - 3) * m2 ** 2
+        numerator = np.where(np.abs(numerator) < 1e-14, 0.0, numerator)
+        denominator = np.where(np.abs(denominator) < 1e-14, 0.0, denominator)
+        kurtosis = numerator / denominator - 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+        kurtosis = np.where(denominator == 0, 0.0, kurtosis)
+        kurtosis[count < 4] = np.nan
+    
+    return count, mean, variance, skewness, kurtosis
+
+
 def calculate_statistics(dataframe: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate comprehensive descriptive statistics.
@@ -20,20 +74,29 @@ def calculate_statistics(dataframe: pd.DataFrame) -> pd.DataFrame:
     if len(numeric_cols) == 0:
         return pd.DataFrame()
     
-    stats_dict = {
-        'count': dataframe[numeric_cols].count(),
-        'mean': dataframe[numeric_cols].mean(),
-        'median': dataframe[numeric_cols].median(),
-        'std': dataframe[numeric_cols].std(),
-        'min': dataframe[numeric_cols].min(),
-        'max': dataframe[numeric_cols].max(),
-        'q25': dataframe[numeric_cols].quantile(0.25),
-        'q75': dataframe[numeric_cols].quantile(0.75),
-        'skewness': dataframe[numeric_cols].skew(),
-        'kurtosis': dataframe[numeric_cols].kurtosis()
-    }
+    # One float64 copy of the numeric block, one row per column so each column is
+    # contiguous (pandas already stores blocks this way, so the transpose is usually
+    # free); every statistic is derived from it instead of ten pandas reductions
+    values = np.ascontiguousarray(dataframe[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan).T)
+    missing = np.isnan(values)
+    count, mean, variance, skewness, kurtosis = _moments(values, missing)
+    std = np.sqrt(variance)
     
-    return pd.DataFrame(stats_dict).T
+    # fmin/fmax skip NaNs without warning on all-missing columns; one quantile
+    # call partitions each column once for the quartiles and the median
+    if missing.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            q25, median, q75 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=1)
+    else:
+        q25, median, q75 = np.quantile(values, [0.25, 0.5, 0.75], axis=1)
+    
+    return pd.DataFrame(
+        [count, mean, median, std, np.fmin.reduce(values, axis=1), np.fmax.reduce(values, axis=1),
+         q25, q75, skewness, kurtosis],
+        index=['count', 'mean', 'median', 'std', 'min', 'max', 'q25', 'q75', 'skewness', 'kurtosis'],
+        columns=numeric_cols
+    )
 
 
 def analyze_correlations(dataframe: pd.DataFrame, method: str = 'pearson') -> pd.DataFrame:
@@ -52,7 +115,44 @@ def analyze_correlations(dataframe: pd.DataFrame, method: str = 'pearson') -> pd
     if len(numeric_cols) < 2:
         return pd.DataFrame()
     
-    return dataframe[numeric_cols].corr(method=method)
+    numeric = dataframe[numeric_cols]
+    if method == 'pearson':
+        # Private float64 copy, one row per column, centered in place below. The matrix
+        # products take either memory order, so strided input needs no re-layout first
+        values = numeric.to_numpy(dtype=np.float64, na_value=np.nan, copy=True).T
+        missing = np.isnan(values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if not missing.any():
+                # Without missing values pairwise deletion changes nothing, so one BLAS
+                # GEMM over the centered rows replaces the pair-by-pair pandas loop.
+                # Scale the small k x k result rather than the data
+                values -= values.mean(axis=1, keepdims=True)
+                scatter = values @ values.T
+                norms = np.sqrt(np.diag(scatter))
+                corr = scatter / norms[:, None] / norms[None, :]
+            else:
+                # Pairwise-complete sums for every pair of columns from four GEMMs over the
+                # zero-filled data and its presence mask: row counts, sums and sums of
+                # squares over the rows each pair shares, and the cross products.
+                # Centering on each column's own mean first keeps the differences of
+                # sums below from cancelling
+                present = (~missing).astype(np.float64)
+                values[missing] = 0.0
+                values -= (values.sum(axis=1) / present.sum(axis=1))[:, None]
+                values[missing] = 0.0
+                pairs = present @ present.T
+                sums = values @ present.T
+                squares = (values * values) @ present.T
+                scatter = values @ values.T - sums * sums.T / pairs
+                spread = squares - sums * sums / pairs
+                corr = scatter / np.sqrt(spread * spread.T)
+        # Zero-variance columns give NaN correlations, as in pandas
+        corr = np.clip(corr, -1.0, 1.0)
+        diagonal = np.diag_indices_from(corr)
+        corr[diagonal] = np.where(np.isnan(corr[diagonal]), np.nan, 1.0)
+        return pd.DataFrame(corr, index=numeric_cols, columns=numeric_cols)
+    
+    return _column_major(numeric).corr(method=method)
 
 
 def feature_relationships(dataframe: pd.DataFrame) -> pd.DataFrame:
@@ -65,6 +165,7 @@ def feature_relationships(dataframe: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame with feature relationships
     """
+    from scipy import stats
     numeric_cols = list(dataframe.select_dtypes(include=[np.number]).columns)
     categorical_cols = list(dataframe.select_dtypes(include=['object', 'category']).columns)
     
@@ -82,24 +183,46 @@ def feature_relationships(dataframe: pd.DataFrame) -> pd.DataFrame:
                 'Strength': _correlation_strength(abs(corr))
             })
     
-    # Categorical to Numeric relationships (using ANOVA-like approach)
-    for cat_col in categorical_cols:
+    # Categorical to Numeric relationships (one-way ANOVA)
+    # One grouped pass per categorical column yields each group's count, mean and
+    # variance for every numeric column; the F statistic follows from those sums.
+    # pandas' grouped reductions release the GIL, so the passes run on a thread each
+    def group_moments(cat_col: str) -> pd.DataFrame:
+        return dataframe.groupby(cat_col, sort=False, observed=True)[numeric_cols].agg(['count', 'mean', 'var'])
+    
+    grouped_stats = []
+    if numeric_cols and categorical_cols:
+        workers = min(os.cpu_count() or 1, len(categorical_cols))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                grouped_stats = list(executor.map(group_moments, categorical_cols))
+        else:
+            grouped_stats = [group_moments(cat_col) for cat_col in categorical_cols]
+    
+    for cat_col, group_stats in zip(categorical_cols, grouped_stats):
+        k = len(group_stats)
         for num_col in numeric_cols:
-            try:
-                groups = [dataframe[dataframe[cat_col] == val][num_col].dropna() 
-                         for val in dataframe[cat_col].unique()]
-                if len(groups) > 1 and all(len(g) > 0 for g in groups):
-                    f_stat, p_value = stats.f_oneway(*groups)
-                    relationships.append({
-                        'Feature_1': cat_col,
-                        'Feature_2': num_col,
-                        'Type': 'Categorical-Numeric',
-                        'F_Statistic': f_stat,
-                        'P_Value': p_value,
-                        'Significant': 'Yes' if p_value < 0.05 else 'No'
-                    })
-            except:
-                pass
+            n = group_stats[(num_col, 'count')].to_numpy(dtype=float)
+            if k < 2 or not (n > 0).all():
+                continue
+            means = group_stats[(num_col, 'mean')].to_numpy()
+            # Single-observation groups have no variance and add nothing within-group
+            variances = np.nan_to_num(group_stats[(num_col, 'var')].to_numpy())
+            total = n.sum()
+            grand_mean = (n * means).sum() / total
+            ss_between = (n * (means - grand_mean) ** 2).sum()
+            ss_within = ((n - 1) * variances).sum()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                f_stat = (ss_between / (k - 1)) / (ss_within / (total - k))
+            p_value = stats.f.sf(f_stat, k - 1, total - k)
+            relationships.append({
+                'Feature_1': cat_col,
+                'Feature_2': num_col,
+                'Type': 'Categorical-Numeric',
+                'F_Statistic': f_stat,
+                'P_Value': p_value,
+                'Significant': 'Yes' if p_value < 0.05 else 'No'
+            })
     
     return pd.DataFrame(relationships)
 
@@ -132,10 +255,11 @@ def hypothesis_test(dataframe: pd.DataFrame, column: str, test_type: str = 'ttes
     Returns:
         Dictionary with test results
     """
+    from scipy import stats
     if column not in dataframe.columns:
         raise ValueError(f"Column '{column}' not found.")
     
-    if dataframe[column].dtype not in [np.number]:
+    if not pd.api.types.is_numeric_dtype(dataframe[column]):
         raise ValueError(f"Column '{column}' must be numeric.")
     
     data = dataframe[column].dropna()
@@ -171,13 +295,16 @@ def hypothesis_test(dataframe: pd.DataFrame, column: str, test_type: str = 'ttes
     return results
 
 
-def distribution_analysis(dataframe: pd.DataFrame, column: str) -> Dict[str, Any]:
+def distribution_analysis(dataframe: pd.DataFrame, column: str,
+                          statistics: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
     """
     Analyze the distribution of a column.
     
     Args:
         dataframe: The dataframe
         column: Column to analyze
+        statistics: Precomputed calculate_statistics(dataframe), reused for the
+            moments, extremes and quartiles
         
     Returns:
         Dictionary with distribution information
@@ -186,26 +313,54 @@ def distribution_analysis(dataframe: pd.DataFrame, column: str) -> Dict[str, Any
         raise ValueError(f"Column '{column}' not found.")
     
     data = dataframe[column].dropna()
+    values = data.to_numpy(dtype=np.float64)
+    
+    if statistics is not None and column in statistics.columns:
+        # Only the tail percentiles and the mode still need the column itself
+        row = statistics[column]
+        mean, median, std = row['mean'], row['median'], row['std']
+        skewness, kurtosis = row['skewness'], row['kurtosis']
+        minimum, maximum, q25, q75 = row['min'], row['max'], row['q25'], row['q75']
+        variance = std ** 2
+        q90, q95, q99 = np.quantile(values, [0.9, 0.95, 0.99]) if len(values) else (np.nan,) * 3
+    else:
+        # All moments from one set of power sums and all percentiles from one
+        # partition of the column, instead of a pandas reduction per statistic
+        _, mean, variance, skewness, kurtosis = (
+            moment[0] for moment in _moments(values[None, :], np.zeros((1, len(values)), dtype=bool)))
+        std = np.sqrt(variance)
+        if len(values):
+            q25, median, q75, q90, q95, q99 = np.quantile(values, [0.25, 0.5, 0.75, 0.9, 0.95, 0.99])
+            minimum, maximum = values.min(), values.max()
+        else:
+            q25 = median = q75 = q90 = q95 = q99 = minimum = maximum = np.nan
+    
+    if len(values):
+        # np.unique sorts, so argmax picks the smallest of the most frequent values like Series.mode
+        uniques, counts = np.unique(data.to_numpy(), return_counts=True)
+        mode = uniques[counts.argmax()]
+    else:
+        mode = None
     
     analysis = {
-        'mean': data.mean(),
-        'median': data.median(),
-        'mode': data.mode().iloc[0] if len(data.mode()) > 0 else None,
-        'std': data.std(),
-        'variance': data.var(),
-        'skewness': data.skew(),
-        'kurtosis': data.kurtosis(),
-        'range': data.max() - data.min(),
-        'iqr': data.quantile(0.75) - data.quantile(0.25),
-        'min': data.min(),
-        'max': data.max(),
+        'mean': mean,
+        'median': median,
+        'mode': mode,
+        'std': std,
+        'variance': variance,
+        'skewness': skewness,
+        'kurtosis': kurtosis,
+        'range': maximum - minimum,
+        'iqr': q75 - q25,
+        'min': minimum,
+        'max': maximum,
         'percentiles': {
-            '25th': data.quantile(0.25),
-            '50th': data.quantile(0.50),
-            '75th': data.quantile(0.75),
-            '90th': data.quantile(0.90),
-            '95th': data.quantile(0.95),
-            '99th': data.quantile(0.99)
+            '25th': q25,
+            '50th': median,
+            '75th': q75,
+            '90th': q90,
+            '95th': q95,
+            '99th': q99
         }
     }
     
@@ -240,18 +395,17 @@ def feature_importance(dataframe: pd.DataFrame, target_column: str) -> pd.DataFr
     if len(numeric_cols) == 0:
         return pd.DataFrame()
     
-    importance = []
-    for col in numeric_cols:
-        corr = abs(dataframe[col].corr(dataframe[target_column]))
-        importance.append({
-            'Feature': col,
-            'Correlation_with_Target': dataframe[col].corr(dataframe[target_column]),
-            'Absolute_Correlation': corr,
-            'Importance_Rank': 0  # Will be set after sorting
-        })
-    
-    importance_df = pd.DataFrame(importance)
-    importance_df = importance_df.sort_values('Absolute_Correlation', ascending=False)
+    # One pairwise-complete correlation per feature; its absolute value is reused
+    correlations = dataframe[numeric_cols].corrwith(dataframe[target_column]).to_numpy()
+    
+    importance = pd.DataFrame({
+        'Feature': numeric_cols,
+        'Correlation_with_Target': correlations,
+        'Absolute_Correlation': np.abs(correlations),
+        'Importance_Rank': 0  # Will be set after sorting
+    })
+    
+    importance_df = importance.sort_values('Absolute_Correlation', ascending=False)
     importance_df['Importance_Rank'] = range(1, len(importance_df) + 1)
     
     return importance_df
@@ -1,90 +1,230 @@
 """Visualization tools for the Visualization Agent"""
+import io
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib
+# Figures are only ever rasterised to PNG for Streamlit; select the non-interactive
+# Agg backend before pyplot is first imported so no GUI backend is ever set up
+matplotlib.use('Agg')
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import Optional, List
+from typing import Optional, List, Sequence, Tuple
 import streamlit as st
+from .statistical_tools import analyze_correlations
+
+
+# Resolution charts are rasterised at
+_DPI = 80
+
+# Largest correlation heatmap whose cells are labelled with their values
+_ANNOTATE_LIMIT = 30
+
+# Columns with at least two slices of this many values are binned on several threads
+_HISTOGRAM_CHUNK = 1 << 20
+
+
+def _figure(figsize: Tuple[float, float], nrows: int = 1, ncols: int = 1):
+    """
+    A figure with one axes, or an nrows x ncols array of them, built directly rather
+    than through pyplot. Skipping pyplot's figure manager saves its canvas setup and
+    global registration, so there is nothing to plt.close and the figure can be built
+    off the main thread.
+    """
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    axes = fig.subplots(nrows, ncols, squeeze=nrows == ncols == 1)
+    # Fixed margins in place of a tight_layout solve over every label; labels that reach
+    # past them are still kept, as _show saves the figure's tight bounding box
+    fig.subplots_adjust(left=0.1, right=0.98, top=0.92, bottom=0.15, wspace=0.4, hspace=0.4)
+    return fig, axes
+
+
+def _show(fig) -> None:
+    """
+    Render fig to PNG once and hand the bytes to st.image. st.pyplot rasterises at
+    dpi=200, four times the pixels of the figure's own resolution used here.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=_DPI, bbox_inches='tight')
+    st.image(buffer.getvalue(), width='stretch')
+
+
+def histogram_counts(dataframe: pd.DataFrame, column: str, bins: int = 30) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Bin counts and edges of a numeric column's histogram, or None for other columns"""
+    series = dataframe[column]
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return None
+    values = series.to_numpy()
+    if values.dtype.kind not in 'iuf':
+        # Nullable extension columns convert once, with their missing values as NaN
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    if not len(values):
+        return np.histogram(values, bins=bins)
+    
+    # Binning over an explicit range drops NaNs as out of range, so missing values need
+    # no dropna copy; fmin/fmax skip them when finding that range (NaN only if all missing)
+    lo, hi = np.fmin.reduce(values), np.fmax.reduce(values)
+    if np.isnan(lo):
+        return np.histogram(values[:0], bins=bins)
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    workers = min(os.cpu_count() or 1, len(values) // _HISTOGRAM_CHUNK)
+    if workers < 2:
+        # Equal-width bins take np.histogram's arithmetic path: each value's bin comes from
+        # scaling its offset from the minimum, with no search through the edges
+        return np.histogram(values, bins=bins, range=(lo, hi))
+    
+    # Large columns are counted in slices on a thread each (NumPy releases the GIL) and
+    # the slice counts summed
+    slices = np.array_split(values, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        partial = list(executor.map(lambda part: np.histogram(part, bins=bins, range=(lo, hi))[0], slices))
+    return np.sum(partial, axis=0), np.linspace(lo, hi, bins + 1)
 
 
 def create_histogram(dataframe: pd.DataFrame, column: str, bins: int = 30, 
-                    title: Optional[str] = None) -> str:
-    """Create a histogram"""
+                    title: Optional[str] = None,
+                    counts: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> str:
+    """Create a histogram; counts is an already computed histogram_counts() of the column"""
     if column not in dataframe.columns:
         return f"Column '{column}' not found."
     
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.hist(dataframe[column].dropna(), bins=bins, edgecolor='black', alpha=0.7)
+    if counts is None:
+        counts = histogram_counts(dataframe, column, bins)
+    
+    fig, ax = _figure((10, 6))
+    if counts is not None:
+        # Only the bars are drawn; the counting happened above or in the caller's cache
+        heights, edges = counts
+        ax.bar(edges[:-1], heights, width=np.diff(edges), align='edge', edgecolor='black', alpha=0.7)
+    else:
+        ax.hist(dataframe[column].dropna(), bins=bins, edgecolor='black', alpha=0.7)
     ax.set_xlabel(column)
     ax.set_ylabel('Frequency')
     ax.set_title(title or f'Histogram of {column}')
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig)
     return f"Histogram created for {column}"
 
 
+def _is_numeric(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
 def create_scatter(dataframe: pd.DataFrame, x_column: str, y_column: str,
-                   title: Optional[str] = None) -> str:
-    """Create a scatter plot"""
+                   title: Optional[str] = None, max_points: int = 50_000) -> str:
+    """Create a scatter plot; above max_points numeric rows it becomes a hexbin density plot"""
     if x_column not in dataframe.columns or y_column not in dataframe.columns:
         return f"One or both columns not found."
     
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.scatter(dataframe[x_column], dataframe[y_column], alpha=0.6)
+    fig, ax = _figure((10, 6))
+    x, y = dataframe[x_column], dataframe[y_column]
+    if len(dataframe) > max_points and _is_numeric(x) and _is_numeric(y):
+        # Past this many points the markers overplot into a solid mass and drawing them
+        # dominates; a fixed hexagon grid shows the same density at constant cost
+        cells = ax.hexbin(x.to_numpy(dtype=np.float64, na_value=np.nan), y.to_numpy(dtype=np.float64, na_value=np.nan),
+                          gridsize=80, cmap='viridis', mincnt=1)
+        fig.colorbar(cells, ax=ax, label='Count')
+    else:
+        ax.scatter(x, y, alpha=0.6)
     ax.set_xlabel(x_column)
     ax.set_ylabel(y_column)
     ax.set_title(title or f'Scatter Plot: {x_column} vs {y_column}')
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig)
     return f"Scatter plot created: {x_column} vs {y_column}"
 
 
-def create_correlation_heatmap(dataframe: pd.DataFrame, title: Optional[str] = None) -> str:
-    """Create a correlation heatmap"""
-    numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
+def create_correlation_heatmap(dataframe: pd.DataFrame, title: Optional[str] = None,
+                               corr: Optional[pd.DataFrame] = None,
+                               numeric_cols: Optional[Sequence[str]] = None) -> str:
+    """
+    Create a correlation heatmap; corr is an already computed matrix of the numeric
+    columns, and numeric_cols their names
+    """
+    if numeric_cols is None:
+        numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
     
     if len(numeric_cols) < 2:
         return "Need at least 2 numeric columns for correlation heatmap."
     
-    corr = dataframe[numeric_cols].corr()
+    if corr is None:
+        # One symmetric matrix product over the centred columns instead of pandas' pair loop
+        corr = analyze_correlations(dataframe)
+    
+    # The matrix is symmetric with a unit diagonal; only the lower triangle is drawn,
+    # as one mesh, with the labels formatted in one call
+    values = corr.to_numpy(dtype=np.float64)
+    k = len(values)
+    shown = np.tril(np.ones((k, k), dtype=bool)) & ~np.isnan(values)
+    fig, ax = _figure((12, 10))
+    mesh = ax.pcolormesh(np.ma.masked_array(values, ~shown), cmap='coolwarm', vmin=-1, vmax=1,
+                         edgecolors='white', linewidth=1)
+    fig.colorbar(mesh, ax=ax, shrink=0.8)
+    ax.set_aspect('equal')
+    ax.invert_yaxis()
+    ax.set_xticks(np.arange(k) + 0.5, corr.columns, rotation=45, ha='right')
+    ax.set_yticks(np.arange(k) + 0.5, corr.index)
+    ax.tick_params(length=0)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
     
-    fig, ax = plt.subplots(figsize=(12, 10))
-    sns.heatmap(corr, annot=True, fmt='.2f', ax=ax, cmap='coolwarm', 
-                center=0, square=True, linewidths=1, cbar_kws={"shrink": 0.8})
+    # Past 30 columns the numbers no longer fit their cells
+    if k <= _ANNOTATE_LIMIT:
+        labels = np.char.mod('%.2f', values)
+        # Light text on dark cells, by the cells' relative luminance
+        rgb = mesh.cmap(mesh.norm(values))[..., :3]
+        linear = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+        dark = linear @ np.array([0.2126, 0.7152, 0.0722]) <= 0.408
+        for i, j in zip(*np.nonzero(shown)):
+            ax.text(j + 0.5, i + 0.5, labels[i, j], ha='center', va='center',
+                    color='white' if dark[i, j] else 'black')
     ax.set_title(title or 'Correlation Heatmap')
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig)
     return "Correlation heatmap created"
 
 
+def _top_counts(series: pd.Series, top_n: int) -> pd.Series:
+    """
+    series.value_counts().head(top_n) without sorting every distinct value's count: the
+    top_n-th largest count is found by partition, and only the counts above it, plus the
+    first-seen of those equal to it, are sorted. Ties keep value_counts' order.
+    """
+    counts = series.value_counts(sort=False)
+    c = counts.to_numpy()
+    if not 0 < top_n < len(c):
+        return counts.sort_values(ascending=False, kind='stable').head(top_n)
+    threshold = np.partition(c, len(c) - top_n)[len(c) - top_n]
+    above = np.flatnonzero(c > threshold)
+    keep = np.concatenate([above, np.flatnonzero(c == threshold)[:top_n - len(above)]])
+    keep.sort()
+    return counts.iloc[keep[np.argsort(-c[keep], kind='stable')]]
+
+
 def create_bar_chart(dataframe: pd.DataFrame, column: str, top_n: int = 20,
-                     title: Optional[str] = None) -> str:
-    """Create a bar chart"""
+                     title: Optional[str] = None, counts: Optional[pd.Series] = None) -> str:
+    """Create a bar chart; counts is an already computed value_counts() of the column"""
     if column not in dataframe.columns:
         return f"Column '{column}' not found."
     
-    value_counts = dataframe[column].value_counts().head(top_n)
+    value_counts = counts.head(top_n) if counts is not None else _top_counts(dataframe[column], top_n)
     
-    fig, ax = plt.subplots(figsize=(12, 6))
+    fig, ax = _figure((12, 6))
     ax.bar(range(len(value_counts)), value_counts.values, color='steelblue', alpha=0.7)
     ax.set_xticks(range(len(value_counts)))
     ax.set_xticklabels(value_counts.index, rotation=45, ha='right')
     ax.set_xlabel(column)
     ax.set_ylabel('Count')
     ax.set_title(title or f'Bar Chart of {column}')
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    _show(fig)
     return f"Bar chart created for {column}"
 
 
 def create_box_plot(dataframe: pd.DataFrame, column: Optional[str] = None,
-                    title: Optional[str] = None) -> str:
-    """Create a box plot"""
-    numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
+                    title: Optional[str] = None,
+                    numeric_cols: Optional[Sequence[str]] = None) -> str:
+    """Create a box plot; numeric_cols are the frame's numeric column names if already known"""
+    if numeric_cols is None:
+        numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
     
     if len(numeric_cols) == 0:
         return "No numeric columns found."
@@ -96,38 +236,83 @@ def create_box_plot(dataframe: pd.DataFrame, column: Optional[str] = None,
     else:
         columns_to_plot = list(numeric_cols[:5])  # Limit to 5 columns
     
-    fig, ax = plt.subplots(figsize=(12, 6))
-    dataframe[columns_to_plot].boxplot(ax=ax)
+    # The quartiles of every column come from one quantile call over the block; the
+    # whiskers reach the furthest values within 1.5 IQR of the box, as in ax.boxplot
+    values = dataframe[columns_to_plot].to_numpy(dtype=np.float64, na_value=np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-missing columns
+        q1, median, q3 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+    reach = 1.5 * (q3 - q1)
+    inside = (values >= q1 - reach) & (values <= q3 + reach)
+    whislo = np.minimum(np.where(inside, values, np.inf).min(axis=0), q1)
+    whishi = np.maximum(np.where(inside, values, -np.inf).max(axis=0), q3)
+    stats = [{'label': str(name), 'q1': q1[i], 'med': median[i], 'q3': q3[i],
+              'whislo': whislo[i], 'whishi': whishi[i],
+              'fliers': values[(values[:, i] < whislo[i]) | (values[:, i] > whishi[i]), i]}
+             for i, name in enumerate(columns_to_plot)]
+    
+    fig, ax = _figure((12, 6))
+    # DataFrame.boxplot's colour scheme
+    ax.bxp(stats, boxprops={'color': 'C0'}, whiskerprops={'color': 'C0'},
+           medianprops={'color': 'C2'}, capprops={'color': 'k'})
+    ax.grid(True)
     ax.set_ylabel('Value')
     ax.set_title(title or 'Box Plot')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    ax.tick_params(axis='x', labelrotation=45)
+    _show(fig)
     return f"Box plot created for {', '.join(columns_to_plot)}"
 
 
+def _envelope(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Positions of the lowest and highest value in each of max_points // 2 equal runs
+    of values, in order. Drawing only these keeps every spike and dip of a long
+    series at the resolution a chart can show. A NaN is kept where a run has no values.
+    """
+    buckets = max(max_points // 2, 1)
+    size = -(-len(values) // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:len(values)] = values
+    padded = padded.reshape(buckets, size)
+    missing = np.isnan(padded)
+    offsets = np.arange(buckets) * size
+    lows = np.where(missing, np.inf, padded).argmin(axis=1) + offsets
+    highs = np.where(missing, -np.inf, padded).argmax(axis=1) + offsets
+    positions = np.union1d(lows, highs)
+    return positions[positions < len(values)]
+
+
 def create_line_plot(dataframe: pd.DataFrame, x_column: str, y_column: str,
-                    title: Optional[str] = None) -> str:
-    """Create a line plot"""
+                    title: Optional[str] = None, max_points: int = 5_000) -> str:
+    """Create a line plot; a numeric series longer than max_points is reduced to its per-run extremes"""
     if x_column not in dataframe.columns or y_column not in dataframe.columns:
         return f"One or both columns not found."
     
-    fig, ax = plt.subplots(figsize=(12, 6))
-    ax.plot(dataframe[x_column], dataframe[y_column], marker='o', linewidth=2, markersize=4)
+    fig, ax = _figure((12, 6))
+    x, y = dataframe[x_column], dataframe[y_column]
+    if len(dataframe) > max_points and _is_numeric(y):
+        keep = _envelope(y.to_numpy(dtype=np.float64, na_value=np.nan), max_points)
+        x, y = x.iloc[keep], y.iloc[keep]
+    ax.plot(x, y, marker='o', linewidth=2, markersize=4)
     ax.set_xlabel(x_column)
     ax.set_ylabel(y_column)
     ax.set_title(title or f'Line Plot: {x_column} vs {y_column}')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    st.pyplot(fig)
-    plt.close(fig)
+    ax.tick_params(axis='x', labelrotation=45)
+    _show(fig)
     return f"Line plot created: {x_column} vs {y_column}"
 
 
-def create_pair_plot(dataframe: pd.DataFrame, columns: Optional[List[str]] = None) -> str:
-    """Create a pair plot for multiple numeric columns"""
-    numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
+def create_pair_plot(dataframe: pd.DataFrame, columns: Optional[List[str]] = None,
+                     max_points: int = 20_000,
+                     numeric_cols: Optional[Sequence[str]] = None) -> str:
+    """
+    Create a pair plot for multiple numeric columns; above max_points rows the cells show
+    densities. numeric_cols are the frame's numeric column names if already known.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    if numeric_cols is None:
+        numeric_cols = dataframe.select_dtypes(include=[np.number]).columns
     
     if len(numeric_cols) < 2:
         return "Need at least 2 numeric columns for pair plot."
@@ -140,9 +325,32 @@ def create_pair_plot(dataframe: pd.DataFrame, columns: Optional[List[str]] = Non
     if len(plot_cols) < 2:
         return "Not enough valid columns for pair plot."
     
+    if len(dataframe) > max_points:
+        # seaborn would draw every row in each of the k^2 cells and fit a KDE per column;
+        # a hexbin per pair and a binned histogram per column cost the same at any size
+        k = len(plot_cols)
+        values = dataframe[plot_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        fig, axes = _figure((2.5 * k, 2.5 * k), k, k)
+        for i in range(k):
+            for j in range(k):
+                ax = axes[i, j]
+                if i == j:
+                    column = values[:, i]
+                    heights, edges = np.histogram(column[~np.isnan(column)], bins=30)
+                    ax.bar(edges[:-1], heights, width=np.diff(edges), align='edge', alpha=0.7)
+                else:
+                    ax.hexbin(values[:, j], values[:, i], gridsize=40, cmap='viridis', mincnt=1)
+                if i == k - 1:
+                    ax.set_xlabel(plot_cols[j])
+                if j == 0:
+                    ax.set_ylabel(plot_cols[i])
+        fig.suptitle('Pair Plot')
+        _show(fig)
+        return f"Pair plot created for {', '.join(plot_cols)}"
+    
     fig = sns.pairplot(dataframe[plot_cols], diag_kind='kde')
     fig.fig.suptitle('Pair Plot', y=1.02)
-    st.pyplot(fig.fig)
+    _show(fig.fig)
     plt.close(fig.fig)
     return f"Pair plot created for {', '.join(plot_cols)}"
 